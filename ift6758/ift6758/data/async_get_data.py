@@ -0,0 +1,256 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Mapping, NamedTuple, Optional, Tuple
+import aiohttp
+from . import get_data
+from .get_data import NHLApiClient, TOMBSTONE_TTL, get_raw_store, parse_game_response
+from .raw_store import decode_payload, project
+
+# the raw stores are synchronous: their reads and writes run on a few shared threads
+# instead of blocking the event loop (and instead of one thread per in-flight game)
+io_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="raw-store-io")
+
+
+async def run_io(function, *args, **kwargs):
+    """run a blocking store call on the I/O threads without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, functools.partial(function, *args, **kwargs))
+
+
+async def closing_at_shutdown(session: aiohttp.ClientSession):
+    """async generator closing a session when it is closed
+
+    Once started, the event loop tracks it and `loop.shutdown_asyncgens()` (called by `asyncio.run`
+    before the loop is closed) closes it, so the session and its pooled connections are closed on
+    their own loop even if the client is never closed explicitly.
+    """
+    try:
+        yield
+    finally:
+        await session.close()
+
+
+class AsyncResponse(NamedTuple):
+    status_code: int
+    headers: Mapping[str, str]
+    content: bytes
+
+    def json(self) -> dict:
+        return decode_payload(self.content)
+
+
+class AsyncNHLApiClient(NHLApiClient):
+    """asyncio flavor of `NHLApiClient` backed by a pooled `aiohttp.ClientSession`
+
+    It has the same timeouts, retry policy and counters. The session is opened lazily on the
+    running event loop and belongs to it: it is closed when the client is closed or when the loop
+    shuts down its async generators (at the end of `asyncio.run`), and a new one is opened if the
+    client is then used from another loop.
+
+    The responses are read on the event loop but decoded by the caller (`AsyncResponse.json`),
+    `retrieve_game_data_async` decodes them on the I/O threads.
+    """
+
+    def make_session(self) -> None:
+        self.loop = None
+        self.session_closer = None
+        return None
+
+    async def open_session(self) -> aiohttp.ClientSession:
+        """get the session of the running event loop (creating it if needed)"""
+        loop = asyncio.get_running_loop()
+        if self.session is not None and not self.session.closed and self.loop is not loop:
+            # the loop of the session did not shut its async generators down: close what can be closed from here
+            await self.close()
+        if self.session is None or self.session.closed or self.loop is not loop:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self.loop = loop
+            self.session_closer = closing_at_shutdown(self.session)
+            await self.session_closer.__anext__()
+        return self.session
+
+    async def close(self):
+        """close the session and its connections"""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        self.session_closer = None
+
+    async def __aenter__(self) -> "AsyncNHLApiClient":
+        await self.open_session()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def get(self, path: str, headers: Optional[Dict[str, str]] = None) -> Optional[AsyncResponse]:
+        """GET a path of the API, retrying transient failures
+
+        Args:
+            path (str): path relative to the base url (ex: /v1/gamecenter/2022020001/play-by-play)
+            headers (Optional[Dict[str, str]]): extra request headers
+
+        Returns:
+            Optional[AsyncResponse]: the last response, or None if no response was ever received
+        """
+        session = await self.open_session()
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        response = None
+        for attempt in range(self.max_retries + 1):
+            self.count("requests")
+            try:
+                async with session.get(url, headers=headers) as raw_response:
+                    response = AsyncResponse(raw_response.status, raw_response.headers, await raw_response.read())
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                response = None
+                error = repr(e)
+            else:
+                if response.status_code not in NHLApiClient.RETRY_STATUS:
+                    if response.status_code >= 400:
+                        self.count("failures")
+                    return response
+                error = response.status_code
+            if attempt == self.max_retries:
+                break
+            delay = self.backoff(attempt, response)
+            print(f"Retrying {url} in {delay:.2f}s ({error})")
+            self.count("retries")
+            await asyncio.sleep(delay)
+        self.count("failures")
+        return response
+
+
+async_api_client: Optional[AsyncNHLApiClient] = None
+closing_clients = set()  # keeps the pending closes of the replaced clients alive until they are done
+
+
+def close_replaced_client(client: AsyncNHLApiClient):
+    """close the session of a client that is no longer used, on the loop of the session when possible
+
+    Args:
+        client (AsyncNHLApiClient): the replaced client
+    """
+    loop = client.loop
+    if client.session is None or client.session.closed or loop is None or loop.is_closed():
+        return  # nothing open (a loop closed by asyncio.run already closed the session)
+    if loop.is_running():
+        closing = asyncio.run_coroutine_threadsafe(client.close(), loop)
+    else:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            loop.run_until_complete(client.close())
+            return
+        closing = running.create_task(client.close())  # the loop of the session is idle: close what can be closed from here
+    closing_clients.add(closing)
+    closing.add_done_callback(closing_clients.discard)
+
+
+def get_async_api_client() -> AsyncNHLApiClient:
+    """get the shared asynchronous client (it targets the base url of `get_data.api_client`)
+
+    The previous client is closed when the base url changes.
+
+    Returns:
+        AsyncNHLApiClient: the client
+    """
+    global async_api_client
+    if async_api_client is None or async_api_client.base_url != get_data.api_client.base_url:
+        if async_api_client is not None:
+            close_replaced_client(async_api_client)
+        async_api_client = AsyncNHLApiClient(get_data.api_client.base_url)
+    return async_api_client
+
+
+async def retrieve_game_data_async(
+    game_id: int,
+    save: bool = False,
+    verbose: bool = False,
+    fields: Optional[List[str]] = None,
+    client: Optional[AsyncNHLApiClient] = None,
+) -> dict:
+    """asynchronous counterpart of `get_data.retrieve_game_data` with the same cache semantics
+
+    Args:
+        game_id (int): the game id
+        save (bool): write the downloaded game, or the tombstone of a game not found, in the raw data cache
+        verbose (bool): print information about the cache
+        fields (Optional[List[str]]): only materialize these paths of the json
+        client (Optional[AsyncNHLApiClient]): the client to download with (defaults to the shared one)
+
+    Returns:
+        dict: the play by play json or None if the game could not be retrieved
+    """
+    store = get_raw_store()
+    data = await run_io(store.load, game_id, verbose=verbose, fields=fields)
+    if data is not None:
+        return data
+
+    if await run_io(store.manifest.is_tombstoned, game_id, TOMBSTONE_TTL):
+        if verbose:
+            print("Skipping game id with a tombstone (not found on the API): ", game_id)
+        return None
+
+    if verbose:
+        print("Downloading data for game id: ", game_id)
+    client = client or get_async_api_client()
+    response = await client.get(f"/v1/gamecenter/{game_id}/play-by-play")
+    if save and response is not None and response.status_code == 404:  # a read-only lookup does not write the cache
+        await run_io(store.manifest.add_tombstone, game_id)
+    data = await run_io(parse_game_response, game_id, response)  # decoded off the event loop
+    if data:  # do not create a file if the download failed
+        if save:
+            await run_io(
+                store.save,
+                game_id,
+                data,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+        if fields is not None:
+            data = project(data, fields)
+    return data
+
+
+async def retrieve_games_data_async(
+    game_ids,
+    concurrency: int = 64,
+    save: bool = True,
+    verbose: bool = False,
+    fields: Optional[List[str]] = None,
+    client: Optional[AsyncNHLApiClient] = None,
+) -> AsyncIterator[Tuple[int, Optional[dict]]]:
+    """fetch many games on the running event loop, yielding each one as soon as it is available
+
+    Args:
+        game_ids (Iterable[int]): the game ids to fetch
+        concurrency (int): maximum number of games in flight
+        save (bool): write the downloaded games in the raw data cache
+        verbose (bool): print progress information
+        fields (Optional[List[str]]): only materialize these paths of the json
+        client (Optional[AsyncNHLApiClient]): the client to download with (defaults to the shared one)
+
+    Yields:
+        Tuple[int, Optional[dict]]: (game id, play by play data or None if the download failed), in completion order
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch(game_id):
+        async with semaphore:
+            try:
+                return game_id, await retrieve_game_data_async(game_id, save, verbose, fields, client)
+            except Exception as e:
+                print(f"Failed to retrieve game ID {game_id}: {e}")
+                return game_id, None
+
+    tasks = [asyncio.ensure_future(fetch(game_id)) for game_id in game_ids]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,138 @@
+import io
+import time
+import argparse
+import tempfile
+import contextlib
+from typing import Callable, Dict, List, Optional
+from . import get_data
+from .raw_store import JsonDirectoryStore
+from .benchmark_utils import load_game_ids, open_store, store_arguments
+from .nhl_api_stub import NHLApiStub
+
+
+def percentile(values: List[float], q: float) -> float:
+    """nearest-rank percentile
+
+    Args:
+        values (List[float]): the samples
+        q (float): the percentile in [0, 100]
+
+    Returns:
+        float: the percentile (nan if there is no sample)
+    """
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    rank = max(0, min(len(values) - 1, int(round(q / 100 * len(values) + 0.5)) - 1))
+    return values[rank]
+
+
+def benchmark_path(name: str, fetch: Callable[[int], Optional[dict]], game_ids: List[int], workers: int) -> Dict[str, float]:
+    """time a download path over a list of games
+
+    Args:
+        name (str): the name of the path in the report
+        fetch (Callable[[int], Optional[dict]]): the per-game download function
+        game_ids (List[int]): the games to fetch
+        workers (int): number of concurrent fetches (1 runs sequentially)
+
+    Returns:
+        Dict[str, float]: games/sec, p50 and p99 latency in ms, number of games fetched, retries and failures
+    """
+    latencies = []
+
+    def timed(game_id):
+        start = time.perf_counter()
+        data = fetch(game_id)
+        latencies.append(time.perf_counter() - start)
+        return data
+
+    get_data.api_client.reset_stats()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if workers == 1:
+            fetched = sum(timed(game_id) is not None for game_id in game_ids)
+        else:
+            results = get_data.map_games_concurrently(timed, game_ids, workers=workers)
+            fetched = sum(data is not None for _, data in results)
+    elapsed = time.perf_counter() - start
+    stats = get_data.api_client.get_stats()
+    return {
+        "path": name,
+        "workers": workers,
+        "games": fetched,
+        "games_per_sec": len(game_ids) / elapsed if elapsed else float("inf"),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "retries": stats["retries"],
+        "failures": stats["failures"],
+    }
+
+
+def run_benchmark(game_ids: List[int], workers: List[int]) -> List[Dict[str, float]]:
+    """benchmark the download paths against the current `get_data.api_client`
+
+    Args:
+        game_ids (List[int]): the games to fetch
+        workers (List[int]): the concurrency levels to try
+
+    Returns:
+        List[Dict[str, float]]: one report per (path, concurrency level)
+    """
+    reports = []
+    previous_store = get_data.raw_store
+    try:
+        for n in workers:
+            reports.append(benchmark_path("download_data", get_data.download_data, game_ids, n))
+            with tempfile.TemporaryDirectory() as cold_cache:  # cold cache so every game is downloaded
+                get_data.set_raw_store(JsonDirectoryStore(cold_cache))
+                fetch = lambda game_id: get_data.retrieve_game_data(game_id, save=True)
+                reports.append(benchmark_path("retrieve_game_data(save=True)", fetch, game_ids, n))
+    finally:
+        get_data.set_raw_store(previous_store)
+    return reports
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="measure the ingestion throughput against a local NHL API stand-in")
+    store_arguments(parser)  # the games replayed by the stand-in
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--base-url", default=None, help="benchmark an already running server instead of the stand-in")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--not-found-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    store = open_store(args)
+    game_ids = load_game_ids(args, store)
+    if not game_ids:
+        parser.error(f"no game to replay in {args.data_dir}")
+
+    server = None
+    if args.base_url is None:
+        server = NHLApiStub(
+            store, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+            not_found_rate=args.not_found_rate, seed=args.seed,
+        ).start()
+    previous_client = get_data.api_client
+    get_data.set_api_client(get_data.NHLApiClient(args.base_url or server.base_url, backoff_factor=0.05))
+    try:
+        reports = run_benchmark(game_ids, args.workers)
+    finally:
+        get_data.set_api_client(previous_client)
+        if server is not None:
+            server.stop()
+
+    print(f"{len(game_ids)} games")
+    print(f"{'path':<32}{'workers':>8}{'games':>8}{'games/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'retries':>9}{'failures':>9}")
+    for report in reports:
+        print(
+            f"{report['path']:<32}{report['workers']:>8}{report['games']:>8}{report['games_per_sec']:>10.1f}"
+            f"{report['p50_ms']:>10.1f}{report['p99_ms']:>10.1f}{report['retries']:>9}{report['failures']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import json
+import time
+import argparse
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+from .raw_store import decode_payload, orjson
+from .benchmark_utils import load_game_ids, open_store, store_arguments
+
+
+def benchmark_loader(name: str, loader: Callable[[bytes], dict], payloads: List[bytes]) -> Dict[str, float]:
+    """time a loader over a list of payloads and measure its peak memory
+
+    Args:
+        name (str): the name of the loader in the report
+        loader (Callable[[bytes], dict]): the function decoding one payload
+        payloads (List[bytes]): the serialized games
+
+    Returns:
+        Dict[str, float]: total parse time in seconds, and in MB the largest peak memory while decoding a
+            single game and the largest memory held by a decoded game
+    """
+    start = time.perf_counter()
+    for payload in payloads:
+        loader(payload)
+    elapsed = time.perf_counter() - start
+    peak = kept = 0
+    for payload in payloads:  # measured separately, tracemalloc slows the decoding down
+        tracemalloc.start()
+        data = loader(payload)
+        current, game_peak = tracemalloc.get_traced_memory()
+        peak, kept = max(peak, game_peak), max(kept, current)
+        tracemalloc.stop()
+        del data
+    return {"loader": name, "seconds": elapsed, "peak_mb": peak / 2**20, "kept_mb": kept / 2**20}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="compare the full and the projected play by play loaders")
+    store_arguments(parser)
+    args = parser.parse_args(argv)
+
+    from ift6758.features.preprocess import GAME_STATS_FIELDS
+
+    store = open_store(args)
+    payloads = [store.read(game_id) for game_id in load_game_ids(args, store)]
+    if not payloads:
+        parser.error(f"no game to load in {args.data_dir}")
+
+    loaders = {
+        "json.loads (full document)": json.loads,
+        "json streaming projection": lambda payload: decode_payload(payload, GAME_STATS_FIELDS, backend="json"),
+    }
+    if orjson is not None:
+        loaders["orjson (full document)"] = lambda payload: decode_payload(payload, backend="orjson")
+        loaders["orjson projection"] = lambda payload: decode_payload(payload, GAME_STATS_FIELDS, backend="orjson")
+
+    print(f"{len(payloads)} games, {sum(map(len, payloads)) / 2**20:.1f} MB")
+    print(f"{'loader':<30}{'seconds':>10}{'peak MB':>10}{'kept MB':>10}")
+    for name, loader in loaders.items():
+        report = benchmark_loader(name, loader, payloads)
+        print(f"{report['loader']:<30}{report['seconds']:>10.2f}{report['peak_mb']:>10.2f}{report['kept_mb']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
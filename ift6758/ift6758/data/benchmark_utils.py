@@ -0,0 +1,51 @@
+import argparse
+from typing import List, Optional
+from . import get_data
+from .raw_store import RAW_DATA_DIR, RAW_STORES, JsonDirectoryStore, RawStore, make_raw_store
+
+
+def store_arguments(parser: argparse.ArgumentParser, limit: Optional[int] = None):
+    """add the arguments picking the games of a raw store, shared by the benchmark scripts
+
+    Args:
+        parser (argparse.ArgumentParser): the parser of the script
+        limit (Optional[int]): default maximum number of games (None for all of them)
+    """
+    parser.add_argument("--store", default=JsonDirectoryStore.name, choices=list(RAW_STORES))
+    parser.add_argument("--data-dir", default=RAW_DATA_DIR)
+    parser.add_argument("--season", type=int, default=None, help="only use the games of a season")
+    parser.add_argument("--limit", type=int, default=limit, help="maximum number of games")
+
+
+def open_store(args: argparse.Namespace, use: bool = False) -> RawStore:
+    """open the raw store of the `store_arguments`
+
+    Args:
+        args (argparse.Namespace): the parsed arguments
+        use (bool): also make it the store of `retrieve_game_data`
+
+    Returns:
+        RawStore: the store
+    """
+    store = make_raw_store(args.store, args.data_dir)
+    if use:
+        get_data.set_raw_store(store)
+    return store
+
+
+def load_game_ids(args: argparse.Namespace, store: Optional[RawStore] = None) -> List[int]:
+    """get the ids of the stored games picked by the `store_arguments`
+
+    Args:
+        args (argparse.Namespace): the parsed arguments
+        store (Optional[RawStore]): the store (defaults to `open_store(args)`)
+
+    Returns:
+        List[int]: the game ids, of the season if one was given, at most `--limit` of them
+    """
+    if store is None:
+        store = open_store(args)
+    game_ids = store.stored_ids()
+    if args.season is not None:
+        game_ids = [game_id for game_id in game_ids if str(game_id).startswith(str(args.season))]
+    return game_ids[: args.limit]
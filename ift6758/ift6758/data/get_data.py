@@ -1,14 +1,22 @@
 import requests
 import os
 import json
-from pathlib import Path
-from json.decoder import JSONDecodeError
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from requests.adapters import HTTPAdapter
+from .raw_store import RawStore, JsonDirectoryStore, make_raw_store, project
+from .manifest import checksum
 
 # https://gitlab.com/dword4/nhlapi/-/blob/master/stats-api.md
 # https://en.wikipedia.org/wiki/List_of_NHL_seasons
 
 REGULAR_SEASON = "02"
 PLAYOFFS = "03"
+NHL_API_BASE_URL = os.environ.get("NHL_API_BASE_URL", "https://api-web.nhle.com")
+TOMBSTONE_TTL = 7 * 24 * 3600  # seconds before a game that returned 404 is probed again
 
 """
 1353 for seasons with 32 teams (2022 - Present)
@@ -65,58 +73,509 @@ def regular_season_game_id_generator(season) -> list[int]:
     return game_ids
 
 
-def download_data(game_id) -> dict:
-    response = requests.get(
-        f"https://api-web.nhle.com/v1/gamecenter/{game_id}/play-by-play"
-    )
+class NHLApiClient:
+    """pooled HTTP client for the NHL API with timeouts and retries
+
+    A single `requests.Session` is shared by every call (and every thread) so that
+    connections are kept alive between games. Transient failures (connection errors,
+    timeouts, 429 and 5xx responses) are retried with an exponential backoff with jitter.
+
+    Args:
+        base_url (str): root url of the API
+        timeout (float): connect/read timeout in seconds of a single attempt
+        max_retries (int): number of retries after the first attempt
+        backoff_factor (float): base delay in seconds of the exponential backoff
+        max_backoff (float): upper bound in seconds of a single backoff delay
+        pool_size (int): maximum number of connections kept alive
+    """
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        base_url: str = NHL_API_BASE_URL,
+        timeout: float = 10.0,
+        max_retries: int = 5,
+        backoff_factor: float = 0.5,
+        max_backoff: float = 30.0,
+        pool_size: int = 32,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self.session = self.make_session()
+        self.lock = threading.Lock()
+        self.stats: Dict[str, int] = {}
+        self.reset_stats()
+
+    def make_session(self) -> requests.Session:
+        """build the keep-alive session shared by every request"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def reset_stats(self):
+        """reset the request counters"""
+        with self.lock:
+            self.stats = {"requests": 0, "retries": 0, "failures": 0}
+
+    def get_stats(self) -> Dict[str, int]:
+        """get a copy of the request counters
+
+        Returns:
+            Dict[str, int]: number of requests sent, of retries and of calls that ended in an error
+        """
+        with self.lock:
+            return dict(self.stats)
+
+    def count(self, key: str):
+        """increment a request counter"""
+        with self.lock:
+            self.stats[key] += 1
+
+    def backoff(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """compute the delay before the next attempt (full jitter, honors Retry-After)
+
+        Args:
+            attempt (int): index of the failed attempt (0 for the first one)
+            response (Optional[requests.Response]): the failed response, if any
+
+        Returns:
+            float: the delay in seconds
+        """
+        if response is not None:
+            try:
+                return min(float(response.headers["Retry-After"]), self.max_backoff)
+            except (KeyError, ValueError):
+                pass
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * 2**attempt))
+
+    def get(self, path: str, **kwargs) -> Optional[requests.Response]:
+        """GET a path of the API, retrying transient failures
+
+        Args:
+            path (str): path relative to the base url (ex: /v1/gamecenter/2022020001/play-by-play)
+            **kwargs: extra arguments forwarded to `requests.Session.get`
+
+        Returns:
+            Optional[requests.Response]: the last response, or None if no response was ever received
+        """
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        kwargs.setdefault("timeout", self.timeout)
+        response = None
+        for attempt in range(self.max_retries + 1):
+            self.count("requests")
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response = None
+                error = e
+            else:
+                if response.status_code not in NHLApiClient.RETRY_STATUS:
+                    if response.status_code >= 400:
+                        self.count("failures")
+                    return response
+                error = response.status_code
+            if attempt == self.max_retries:
+                break
+            delay = self.backoff(attempt, response)
+            print(f"Retrying {url} in {delay:.2f}s ({error})")
+            self.count("retries")
+            time.sleep(delay)
+        self.count("failures")
+        return response
+
+
+api_client = NHLApiClient()
+
+
+def set_api_client(client: NHLApiClient):
+    """replace the client used to download the games (ex: to target a local stand-in server)
+
+    Args:
+        client (NHLApiClient): the new client
+    """
+    global api_client
+    api_client = client
+
 
-    if response.status_code == 200:
+def request_game(game_id, headers: Optional[Dict[str, str]] = None) -> Optional[requests.Response]:
+    """send the play by play request of a game
+
+    Args:
+        game_id (int): the game id
+        headers (Optional[Dict[str, str]]): extra request headers (ex: conditional request validators)
+
+    Returns:
+        Optional[requests.Response]: the response or None if the API could not be reached
+    """
+    return api_client.get(f"/v1/gamecenter/{game_id}/play-by-play", headers=headers)
+
+
+def parse_game_response(game_id, response: Optional[requests.Response]) -> dict:
+    if response is not None and response.status_code == 200:
         data = response.json()
         print("Downloaded game id: ", game_id)
         return data
     else:
-        print(f"Failed to retrieve game ID {game_id}: {response.status_code}")
+        status = response.status_code if response is not None else "no response"
+        print(f"Failed to retrieve game ID {game_id}: {status}")
         return None
 
 
-def load_cached_data(file_path) -> dict:
-    with open(file_path, "r") as file:
-        print("using cached data for game id: ", file_path.split("/")[-1])
-        try:
-            data = json.load(file)
-            return data
-        except JSONDecodeError:
-            print(
-                f"Error decoding JSON from response for game ID: {file_path.split('/')[-1]}"
-            )
-        return None
+def download_data(game_id) -> dict:
+    return parse_game_response(game_id, request_game(game_id))
+
+
+raw_store: Optional[RawStore] = None
+
+
+def get_raw_store() -> RawStore:
+    """get the raw data store used by `retrieve_game_data`
+
+    The backend is picked by the IFT6758_RAW_STORE environment variable ("json" by default,
+    or "sharded" for the per-season compressed shards) unless one was set with `set_raw_store`.
 
+    Returns:
+        RawStore: the raw data store
+    """
+    global raw_store
+    if raw_store is None:
+        raw_store = make_raw_store(os.environ.get("IFT6758_RAW_STORE", JsonDirectoryStore.name))
+    return raw_store
 
-def retrieve_game_data(game_id: int, save: bool = False, verbose: bool = False) -> dict:
-    data_dir = (
-        Path(__file__).resolve().parent.as_posix() + "/raw_data"
-    )  # path to the raw data directory relative to this file
-    filename = f"{game_id}.json"
-    file_path = f"{data_dir}/{filename}"
-    if not os.path.exists(data_dir):
-        print("Creating directory: ", data_dir)
-        os.makedirs(data_dir)
-    if os.path.exists(file_path):
+
+def set_raw_store(store: RawStore):
+    """replace the raw data store used by `retrieve_game_data`
+
+    Args:
+        store (RawStore): the new store
+    """
+    global raw_store
+    raw_store = store
+
+
+def missing_games(season, playoffs: bool = False) -> list:
+    """find the games of a season that are not in the raw data cache (the cached games are not read)
+
+    Args:
+        season (int | str): the season (ex: 2022)
+        playoffs (bool): also check the playoff game ids
+
+    Returns:
+        list: the missing game ids
+    """
+    return get_raw_store().missing(season_game_ids(season, playoffs=playoffs))
+
+
+def retrieve_game_data(
+    game_id: int, save: bool = False, verbose: bool = False, fields: Optional[List[str]] = None
+) -> dict:
+    store = get_raw_store()
+    data = store.load(game_id, verbose=verbose, fields=fields)
+    if data is not None:
+        return data
+
+    if store.manifest.is_tombstoned(game_id, TOMBSTONE_TTL):
         if verbose:
-            print("Using cached data for game id: ", game_id)
-        data = load_cached_data(file_path)
-        if data:
-            return data
-        else:  # file is present but corrupted: remove it, and redownload
-            if verbose:
-                print("Removing corrupted file: ", file_path)
-            os.remove(file_path)
+            print("Skipping game id with a tombstone (not found on the API): ", game_id)
+        return None
 
     if verbose:
         print("Downloading data for game id: ", game_id)
-    data = download_data(game_id)
+    response = request_game(game_id)
+    if save and response is not None and response.status_code == 404:  # a read-only lookup does not write the cache
+        store.manifest.add_tombstone(game_id)
+    data = parse_game_response(game_id, response)
     if data:  # do not create a file if the download failed
         if save:
-            with open(f"{data_dir}/{filename}", "w") as file:
-                json.dump(data, file)
+            store.save(
+                game_id,
+                data,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+        if fields is not None:
+            data = project(data, fields)
     return data
+
+
+def refresh_game_data(game_id: int, verbose: bool = False) -> str:
+    """re-fetch a cached game, with a conditional request when the cache holds validators
+
+    Args:
+        game_id (int): the game id
+        verbose (bool): print progress information
+
+    Returns:
+        str: "updated" if a new version was cached, "not_modified" if the cached version is current, "failed" otherwise
+    """
+    store = get_raw_store()
+    entry = store.manifest.get(game_id)
+    headers = {}
+    if entry is not None:
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+    if verbose:
+        print("Refreshing data for game id: ", game_id)
+    response = request_game(game_id, headers)
+    if response is not None and response.status_code == 304:
+        store.manifest.touch(game_id)
+        return "not_modified"
+    data = parse_game_response(game_id, response)
+    if not data:
+        return "failed"
+    etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+    payload = json.dumps(data).encode("utf-8")
+    if entry is not None and entry.checksum == checksum(payload):  # the API ignored the validators but nothing changed
+        store.manifest.record(game_id, payload, data.get("gameState"), None, etag, last_modified)
+        return "not_modified"
+    store.save(game_id, data, etag=etag, last_modified=last_modified)
+    return "updated"
+
+
+class RateLimiter:
+    """thread-safe limiter spacing out calls to at most `rate` per second
+
+    Args:
+        rate (Optional[float]): maximum number of calls per second (None or 0 disables the limit)
+    """
+
+    def __init__(self, rate: Optional[float] = None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def wait(self):
+        """block until the next call is allowed"""
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def season_game_ids(season, playoffs: bool = False) -> list:
+    """get every game id of a season
+
+    Args:
+        season (int | str): the season (ex: 2022)
+        playoffs (bool): also include the playoff game ids
+
+    Returns:
+        list: the regular season game ids followed by the playoff game ids if requested
+    """
+    game_ids = regular_season_game_id_generator(season)
+    if playoffs:
+        game_ids += [int(clean_playoff_game_id(game_id)) for game_id in playoff_game_id_generator(season)]
+    return game_ids
+
+
+def playoff_series_dependencies(game_ids) -> Dict[int, List[int]]:
+    """get the games that must exist before probing the late games of each playoff series
+
+    A series is over after 4 wins, so game 5 is only worth probing if games 1 to 4 exist,
+    game 6 if game 5 exists and game 7 if game 6 exists.
+
+    Args:
+        game_ids (Iterable[int]): the game ids
+
+    Returns:
+        Dict[int, List[int]]: playoff game id -> the earlier game ids of its series it depends on
+    """
+    game_ids = {int(game_id) for game_id in game_ids}
+    dependencies = {}
+    for game_id in game_ids:
+        game_number = game_id % 10
+        if str(game_id)[4:6] != PLAYOFFS or game_number < 5:
+            continue
+        first_game = 1 if game_number == 5 else game_number - 1
+        series = game_id - game_number
+        dependencies[game_id] = [
+            series + number for number in range(first_game, game_number) if series + number in game_ids
+        ]
+    return dependencies
+
+
+def map_games_concurrently(
+    function: Callable[[int], Any],
+    game_ids,
+    workers: int = 8,
+    rate_limit: Optional[float] = None,
+    dependencies: Optional[Dict[int, List[int]]] = None,
+) -> Iterator[Tuple[int, Any]]:
+    """apply a per-game function on a pool of threads, yielding results as they complete
+
+    A game listed in `dependencies` is only started once all the games it depends on returned
+    a result other than None; if one of them returns None, the game is skipped (and yielded
+    with a None result) without calling the function. If the generator is closed early (or the
+    consumer raises), the calls not started yet are cancelled.
+
+    Args:
+        function (Callable[[int], Any]): the function called with each game id
+        game_ids (Iterable[int]): the game ids
+        workers (int): maximum number of concurrent calls
+        rate_limit (Optional[float]): maximum number of calls started per second (None for no limit)
+        dependencies (Optional[Dict[int, List[int]]]): game id -> game ids that must succeed first
+
+    Yields:
+        Tuple[int, Any]: (game id, result of the function or None if it raised or was skipped), in completion order
+    """
+    limiter = RateLimiter(rate_limit)
+    game_ids = list(game_ids)
+    requested = set(game_ids)
+    waiting = {
+        game_id: {prerequisite for prerequisite in (dependencies or {}).get(game_id, ()) if prerequisite in requested}
+        for game_id in game_ids
+    }
+    dependents: Dict[int, List[int]] = {}
+    for game_id, prerequisites in waiting.items():
+        for prerequisite in prerequisites:
+            dependents.setdefault(prerequisite, []).append(game_id)
+
+    def call(game_id):
+        limiter.wait()
+        return function(game_id)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        pending = {}
+        for game_id in game_ids:
+            if not waiting[game_id]:
+                del waiting[game_id]
+                pending[executor.submit(call, game_id)] = game_id
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                game_id = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Failed to retrieve game ID {game_id}: {e}")
+                    result = None
+                yield game_id, result
+                if result is None:  # skip every game depending on this one
+                    stack = [game_id]
+                    while stack:
+                        for dependent in dependents.pop(stack.pop(), ()):
+                            if waiting.pop(dependent, None) is not None:
+                                yield dependent, None
+                                stack.append(dependent)
+                    continue
+                for dependent in dependents.pop(game_id, ()):
+                    if dependent not in waiting:
+                        continue
+                    waiting[dependent].discard(game_id)
+                    if not waiting[dependent]:
+                        del waiting[dependent]
+                        pending[executor.submit(call, dependent)] = dependent
+    finally:
+        # the consumer may stop early (or raise): drop the queued calls and only wait for the running ones
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def retrieve_games_data(
+    game_ids,
+    workers: int = 8,
+    rate_limit: Optional[float] = None,
+    save: bool = True,
+    verbose: bool = False,
+) -> Iterator[Tuple[int, Optional[dict]]]:
+    """fetch many games concurrently, yielding each one as soon as it is available
+
+    Cached games are read from the raw_data directory, the others are downloaded
+    (and written to the cache if `save` is set) by a pool of `workers` threads.
+    Games 5 to 7 of a playoff series are only probed if the previous games of the series exist.
+
+    Args:
+        game_ids (Iterable[int]): the game ids to fetch
+        workers (int): maximum number of games fetched at the same time
+        rate_limit (Optional[float]): maximum number of games started per second (None for no limit)
+        save (bool): write the downloaded games in the raw_data cache
+        verbose (bool): print progress information
+
+    Yields:
+        Tuple[int, Optional[dict]]: (game id, play by play data or None if the download failed), in completion order
+    """
+    def fetch(game_id):
+        return retrieve_game_data(game_id, save=save, verbose=verbose)
+
+    game_ids = list(game_ids)
+    yield from map_games_concurrently(
+        fetch,
+        game_ids,
+        workers=workers,
+        rate_limit=rate_limit,
+        dependencies=playoff_series_dependencies(game_ids),
+    )
+
+
+def retrieve_season_data(
+    season,
+    workers: int = 8,
+    rate_limit: Optional[float] = None,
+    playoffs: bool = False,
+    save: bool = True,
+    verbose: bool = False,
+) -> Iterator[Tuple[int, Optional[dict]]]:
+    """fetch every game of a season concurrently (see `retrieve_games_data`)
+
+    Args:
+        season (int | str): the season (ex: 2022)
+        workers (int): maximum number of games fetched at the same time
+        rate_limit (Optional[float]): maximum number of games started per second (None for no limit)
+        playoffs (bool): also fetch the playoff games
+        save (bool): write the downloaded games in the raw_data cache
+        verbose (bool): print progress information
+
+    Yields:
+        Tuple[int, Optional[dict]]: (game id, play by play data or None if the download failed), in completion order
+    """
+    yield from retrieve_games_data(
+        season_game_ids(season, playoffs=playoffs),
+        workers=workers,
+        rate_limit=rate_limit,
+        save=save,
+        verbose=verbose,
+    )
+
+
+def sync_stale_games(
+    season=None,
+    workers: int = 8,
+    rate_limit: Optional[float] = None,
+    verbose: bool = False,
+) -> Dict[str, list]:
+    """incrementally refresh the cache: re-fetch only the cached games that were not final
+
+    Games cached while in progress (or scheduled) are revalidated with conditional requests,
+    final games are never touched.
+
+    Args:
+        season (Optional[int]): restrict the sync to a season (ex: 2023)
+        workers (int): maximum number of games refreshed at the same time
+        rate_limit (Optional[float]): maximum number of requests started per second (None for no limit)
+        verbose (bool): print progress information
+
+    Returns:
+        Dict[str, list]: the game ids grouped by outcome ("updated", "not_modified", "failed")
+    """
+    stale = [entry.game_id for entry in get_raw_store().manifest.stale(season)]
+    outcomes = {"updated": [], "not_modified": [], "failed": []}
+    refresh = lambda game_id: refresh_game_data(game_id, verbose=verbose)
+    for game_id, outcome in map_games_concurrently(refresh, stale, workers=workers, rate_limit=rate_limit):
+        outcomes[outcome or "failed"].append(game_id)
+    if verbose:
+        print({outcome: len(game_ids) for outcome, game_ids in outcomes.items()})
+    return outcomes
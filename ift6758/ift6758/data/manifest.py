@@ -0,0 +1,285 @@
+import time
+import hashlib
+import sqlite3
+from pathlib import Path
+from contextlib import closing
+from typing import Iterable, List, NamedTuple, Optional
+
+FINAL_GAME_STATES = {"OFF", "FINAL"}
+
+
+def checksum(payload: bytes) -> str:
+    """compute the checksum of a raw payload
+
+    Args:
+        payload (bytes): the serialized play by play json
+
+    Returns:
+        str: the hexadecimal checksum
+    """
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def season_bounds(season) -> tuple:
+    """get the smallest and largest possible game id of a season
+
+    Args:
+        season (int | str): the season (ex: 2022)
+
+    Returns:
+        tuple: (first id, last id)
+    """
+    season = int(season)
+    return season * 1000000, (season + 1) * 1000000 - 1
+
+
+class ManifestEntry(NamedTuple):
+    game_id: int
+    size: int
+    checksum: str
+    fetched_at: float
+    game_state: Optional[str]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def is_final(self) -> bool:
+        """check if the game was over when it was fetched
+
+        Returns:
+            bool: True if the cached game is final
+        """
+        return self.game_state in FINAL_GAME_STATES
+
+
+class CacheManifest:
+    """index of a raw data store: one entry per cached game with its size, checksum, fetch time and state
+
+    The manifest is a small SQLite file living next to the cached games, so coverage questions
+    are answered without opening the games and corruption is detected by comparing checksums.
+
+    Args:
+        path (str | Path): path of the manifest file
+    """
+
+    COLUMNS = "game_id, size, checksum, fetched_at, game_state, etag, last_modified"
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with closing(self.connect()) as connection, connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "game_id INTEGER PRIMARY KEY, size INTEGER NOT NULL, checksum TEXT NOT NULL, "
+                "fetched_at REAL NOT NULL, game_state TEXT, etag TEXT, last_modified TEXT)"
+            )
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(entries)")}
+            for column in ("etag", "last_modified"):  # manifests created before conditional requests
+                if column not in columns:
+                    connection.execute(f"ALTER TABLE entries ADD COLUMN {column} TEXT")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS tombstones (game_id INTEGER PRIMARY KEY, created_at REAL NOT NULL)"
+            )
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=60)
+
+    def get(self, game_id) -> Optional[ManifestEntry]:
+        """get the entry of a game
+
+        Args:
+            game_id (int): the game id
+
+        Returns:
+            Optional[ManifestEntry]: the entry or None if the game is not in the manifest
+        """
+        with closing(self.connect()) as connection:
+            row = connection.execute(
+                f"SELECT {CacheManifest.COLUMNS} FROM entries WHERE game_id = ?", (int(game_id),)
+            ).fetchone()
+        return ManifestEntry(*row) if row else None
+
+    def record(
+        self,
+        game_id,
+        payload: bytes,
+        game_state: Optional[str],
+        fetched_at: Optional[float] = None,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> ManifestEntry:
+        """add or replace the entry of a game
+
+        Args:
+            game_id (int): the game id
+            payload (bytes): the serialized play by play json as stored
+            game_state (Optional[str]): the gameState field of the play by play json
+            fetched_at (Optional[float]): fetch timestamp (defaults to now)
+            etag (Optional[str]): ETag header of the response the game was fetched from
+            last_modified (Optional[str]): Last-Modified header of the response the game was fetched from
+
+        Returns:
+            ManifestEntry: the new entry
+        """
+        entry = ManifestEntry(
+            int(game_id), len(payload), checksum(payload), fetched_at or time.time(), game_state, etag, last_modified
+        )
+        with closing(self.connect()) as connection, connection:
+            connection.execute(
+                f"INSERT OR REPLACE INTO entries ({CacheManifest.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)", entry
+            )
+        return entry
+
+    def touch(self, game_id, fetched_at: Optional[float] = None):
+        """update the fetch time of a game that was revalidated without changes
+
+        Args:
+            game_id (int): the game id
+            fetched_at (Optional[float]): revalidation timestamp (defaults to now)
+        """
+        with closing(self.connect()) as connection, connection:
+            connection.execute(
+                "UPDATE entries SET fetched_at = ? WHERE game_id = ?", (fetched_at or time.time(), int(game_id))
+            )
+
+    def remove(self, game_id):
+        """remove the entry of a game (no-op if it is missing)
+
+        Args:
+            game_id (int): the game id
+        """
+        with closing(self.connect()) as connection, connection:
+            connection.execute("DELETE FROM entries WHERE game_id = ?", (int(game_id),))
+
+    def entries(self, season=None) -> List[ManifestEntry]:
+        """list the entries, optionally restricted to a season
+
+        Args:
+            season (Optional[int]): the season (ex: 2022)
+
+        Returns:
+            List[ManifestEntry]: the entries sorted by game id
+        """
+        query = f"SELECT {CacheManifest.COLUMNS} FROM entries"
+        params = ()
+        if season is not None:
+            query += " WHERE game_id BETWEEN ? AND ?"
+            params = season_bounds(season)
+        with closing(self.connect()) as connection:
+            rows = connection.execute(query + " ORDER BY game_id", params).fetchall()
+        return [ManifestEntry(*row) for row in rows]
+
+    def stale(self, season=None) -> List[ManifestEntry]:
+        """list the entries of the games that were not final when they were cached
+
+        Args:
+            season (Optional[int]): the season (ex: 2022)
+
+        Returns:
+            List[ManifestEntry]: the entries sorted by game id
+        """
+        return [entry for entry in self.entries(season) if not entry.is_final()]
+
+    def game_ids(self, season=None) -> List[int]:
+        """list the cached game ids, optionally restricted to a season
+
+        Args:
+            season (Optional[int]): the season (ex: 2022)
+
+        Returns:
+            List[int]: the sorted game ids
+        """
+        return [entry.game_id for entry in self.entries(season)]
+
+    def missing(self, game_ids: Iterable[int]) -> List[int]:
+        """find the games that are not cached
+
+        Args:
+            game_ids (Iterable[int]): the expected game ids
+
+        Returns:
+            List[int]: the expected game ids absent from the manifest (in the input order)
+        """
+        game_ids = [int(game_id) for game_id in game_ids]
+        cached = set()
+        for season in {game_id // 1000000 for game_id in game_ids}:
+            cached.update(self.game_ids(season))
+        return [game_id for game_id in game_ids if game_id not in cached]
+
+    def add_tombstone(self, game_id, created_at: Optional[float] = None):
+        """remember that a game does not exist on the API (ex: a playoff game that was never played)
+
+        Args:
+            game_id (int): the game id
+            created_at (Optional[float]): timestamp of the failed probe (defaults to now)
+        """
+        with closing(self.connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO tombstones (game_id, created_at) VALUES (?, ?)",
+                (int(game_id), created_at or time.time()),
+            )
+
+    def is_tombstoned(self, game_id, max_age: Optional[float] = None) -> bool:
+        """check if a game has a tombstone, expired tombstones are dropped
+
+        Args:
+            game_id (int): the game id
+            max_age (Optional[float]): lifetime of a tombstone in seconds (None for no expiry)
+
+        Returns:
+            bool: True if the game has a live tombstone
+        """
+        with closing(self.connect()) as connection:
+            row = connection.execute(
+                "SELECT created_at FROM tombstones WHERE game_id = ?", (int(game_id),)
+            ).fetchone()
+        if row is None:
+            return False
+        if max_age is not None and time.time() - row[0] > max_age:
+            self.remove_tombstone(game_id)
+            return False
+        return True
+
+    def remove_tombstone(self, game_id):
+        """remove the tombstone of a game (no-op if it has none)
+
+        Args:
+            game_id (int): the game id
+        """
+        with closing(self.connect()) as connection, connection:
+            connection.execute("DELETE FROM tombstones WHERE game_id = ?", (int(game_id),))
+
+    def tombstones(self, season=None) -> List[int]:
+        """list the tombstoned game ids, optionally restricted to a season
+
+        Args:
+            season (Optional[int]): the season (ex: 2022)
+
+        Returns:
+            List[int]: the sorted game ids
+        """
+        query = "SELECT game_id FROM tombstones"
+        params = ()
+        if season is not None:
+            query += " WHERE game_id BETWEEN ? AND ?"
+            params = season_bounds(season)
+        with closing(self.connect()) as connection:
+            rows = connection.execute(query + " ORDER BY game_id", params).fetchall()
+        return [row[0] for row in rows]
+
+    def purge_tombstones(self, max_age: Optional[float] = None) -> int:
+        """drop the expired tombstones (all of them if `max_age` is None)
+
+        Args:
+            max_age (Optional[float]): lifetime of a tombstone in seconds
+
+        Returns:
+            int: the number of dropped tombstones
+        """
+        with closing(self.connect()) as connection, connection:
+            if max_age is None:
+                cursor = connection.execute("DELETE FROM tombstones")
+            else:
+                cursor = connection.execute(
+                    "DELETE FROM tombstones WHERE created_at < ?", (time.time() - max_age,)
+                )
+        return cursor.rowcount
@@ -0,0 +1,155 @@
+import re
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from .raw_store import RAW_DATA_DIR, RAW_STORES, JsonDirectoryStore, RawStore, make_raw_store
+from .manifest import checksum
+
+PLAY_BY_PLAY_PATH = re.compile(r"^/v1/gamecenter/(\d+)/play-by-play/?$")
+
+
+class NHLApiStub(ThreadingHTTPServer):
+    """local stand-in for the NHL API serving the play by play payloads of a raw store
+
+    Used to replay ingestion offline and to benchmark the download paths. Games missing from
+    the store answer 404, and latency, transient errors (503) and spurious 404s can be injected.
+    Responses carry an ETag (the payload checksum) and honor If-None-Match.
+
+    Args:
+        store (RawStore): the store holding the payloads to serve
+        host (str): the interface to bind
+        port (int): the port to bind (0 picks a free port)
+        latency (float): base delay in seconds added to every response
+        jitter (float): extra uniformly distributed delay in seconds
+        error_rate (float): probability of answering 503
+        not_found_rate (float): probability of answering 404 for a stored game
+        seed (Optional[int]): seed of the fault injection
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        store: RawStore,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        not_found_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        super().__init__((host, port), NHLApiStubHandler)
+        self.store = store
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.not_found_rate = not_found_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def draw(self) -> tuple:
+        """draw the injected faults of a request
+
+        Returns:
+            tuple: (delay in seconds, answer 503, answer 404)
+        """
+        with self.lock:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            return delay, self.random.random() < self.error_rate, self.random.random() < self.not_found_rate
+
+    def start(self) -> "NHLApiStub":
+        """serve in a background thread
+
+        Returns:
+            NHLApiStub: the running server
+        """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """stop serving and release the port"""
+        self.shutdown()
+        self.server_close()
+
+
+class NHLApiStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_empty(self, status: int):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        match = PLAY_BY_PLAY_PATH.match(self.path)
+        if match is None:
+            return self.send_empty(404)
+        delay, error, not_found = self.server.draw()
+        if delay:
+            time.sleep(delay)
+        if error:
+            return self.send_empty(503)
+        payload = None if not_found else self.server.store.read(int(match.group(1)))
+        if payload is None:
+            return self.send_empty(404)
+        etag = f'"{checksum(payload)}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="serve a raw data directory as a local NHL API stand-in")
+    parser.add_argument("--store", default=JsonDirectoryStore.name, choices=list(RAW_STORES))
+    parser.add_argument("--data-dir", default=RAW_DATA_DIR)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="base delay of every response in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a 503 response")
+    parser.add_argument("--not-found-rate", type=float, default=0.0, help="probability of a spurious 404")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+    server = NHLApiStub(
+        make_raw_store(args.store, args.data_dir),
+        args.host,
+        args.port,
+        args.latency,
+        args.jitter,
+        args.error_rate,
+        args.not_found_rate,
+        args.seed,
+    )
+    print(f"Serving {args.data_dir} on {server.base_url} (set NHL_API_BASE_URL to use it)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,536 @@
+import os
+import json
+import zlib
+import sqlite3
+import argparse
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from contextlib import closing, contextmanager, suppress
+from json.decoder import JSONDecodeError, scanstring
+from typing import Any, Dict, Iterable, List, Optional
+from .manifest import CacheManifest, checksum
+
+try:  # optional faster decoder
+    import orjson
+except ImportError:
+    orjson = None
+try:  # not available on Windows: the locks are then only shared by the threads of a process
+    import fcntl
+except ImportError:
+    fcntl = None
+
+RAW_DATA_DIR = Path(__file__).resolve().parent / "raw_data"  # raw data directory relative to this file
+LOCK_STRIPES = 256  # number of lock files the game locks are spread over
+JSON_BACKEND = os.environ.get("IFT6758_JSON_BACKEND", "orjson" if orjson is not None else "json")
+
+
+def game_season(game_id) -> int:
+    """get the season of a game from its id (ex: 2022020001 -> 2022)
+
+    Args:
+        game_id (int | str): the game id
+
+    Returns:
+        int: the season
+    """
+    return int(str(game_id)[:4])
+
+
+def project(data: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+    """keep only some subtrees of a json object
+
+    Args:
+        data (Dict[str, Any]): the json object
+        fields (Iterable[str]): the paths to keep (if the key is nested, use '.' to separate the keys)
+
+    Returns:
+        Dict[str, Any]: a new object holding only the requested paths that exist in `data`
+    """
+    res = {}
+    for field in fields:
+        path = field.split(".")
+        val, dest = data, res
+        for p in path[:-1]:
+            if not isinstance(val, dict) or p not in val:
+                break
+            val = val[p]
+            dest = dest.setdefault(p, {})
+        else:
+            if isinstance(val, dict) and path[-1] in val:
+                dest[path[-1]] = val[path[-1]]
+    return res
+
+
+_WHITESPACE = " \t\n\r"
+_decoder = json.JSONDecoder()
+
+
+def _skip_whitespace(text: str, idx: int) -> int:
+    while idx < len(text) and text[idx] in _WHITESPACE:
+        idx += 1
+    return idx
+
+
+def stream_top_level(text: str, keys: Iterable[str]) -> Dict[str, Any]:
+    """decode only the requested top-level members of a json object
+
+    Members are decoded one at a time and the ones that are not requested are dropped
+    right away, so the whole document is never materialized at once.
+
+    Args:
+        text (str): the serialized json object
+        keys (Iterable[str]): the top-level keys to keep
+
+    Returns:
+        Dict[str, Any]: the requested members
+    """
+    keys = set(keys)
+    res = {}
+    idx = _skip_whitespace(text, 0)
+    if text[idx : idx + 1] != "{":
+        raise JSONDecodeError("Expecting '{'", text, idx)
+    idx = _skip_whitespace(text, idx + 1)
+    if text[idx : idx + 1] == "}":
+        return res
+    while True:
+        if text[idx : idx + 1] != '"':
+            raise JSONDecodeError("Expecting property name enclosed in double quotes", text, idx)
+        key, idx = scanstring(text, idx + 1)
+        idx = _skip_whitespace(text, idx)
+        if text[idx : idx + 1] != ":":
+            raise JSONDecodeError("Expecting ':' delimiter", text, idx)
+        value, idx = _decoder.raw_decode(text, _skip_whitespace(text, idx + 1))
+        if key in keys:
+            res[key] = value
+        del value
+        idx = _skip_whitespace(text, idx)
+        if text[idx : idx + 1] == "}":
+            return res
+        if text[idx : idx + 1] != ",":
+            raise JSONDecodeError("Expecting ',' delimiter", text, idx)
+        idx = _skip_whitespace(text, idx + 1)
+
+
+def decode_payload(payload: bytes, fields: Optional[Iterable[str]] = None, backend: Optional[str] = None) -> Any:
+    """decode a stored play by play payload, optionally keeping only some subtrees
+
+    The "json" backend streams the top-level members with the standard library and only keeps the
+    requested ones, so its peak memory is about the largest member plus the kept ones. The "orjson"
+    backend decodes the whole document with orjson and then projects it: it is faster, but its peak
+    memory is the whole document, the projection only saves the memory of the objects held
+    afterwards. Prefer the "json" backend when the peak memory matters more than the speed
+    (`benchmark_loading` reports the time, peak and kept memory of both).
+
+    Args:
+        payload (bytes): the serialized json
+        fields (Optional[Iterable[str]]): the paths to keep (None for the whole document)
+        backend (Optional[str]): "orjson" or "json" (defaults to JSON_BACKEND)
+
+    Returns:
+        Any: the decoded json
+    """
+    backend = backend or JSON_BACKEND
+    if backend == "orjson":
+        try:
+            data = orjson.loads(payload)
+        except orjson.JSONDecodeError as e:  # report it like the standard library does
+            raise JSONDecodeError(str(e), "", 0)
+        return data if fields is None else project(data, fields)
+    if fields is None:
+        return json.loads(payload)
+    fields = list(fields)
+    data = stream_top_level(payload.decode("utf-8"), {field.split(".")[0] for field in fields})
+    return project(data, fields)
+
+
+class RawStore(ABC):
+    """interface of the raw play by play storage backends
+
+    A backend maps a game id to the serialized play by play json returned by the NHL API.
+    Subclasses only implement the abstract byte level `read`/`write`/`delete`/`stored_ids`
+    (a backend missing one of them can not be instantiated); every
+    write is recorded in the store's manifest, and every read is checked against the
+    manifest checksum before being parsed.
+    """
+
+    name = "base"
+
+    def __init__(self, data_dir=RAW_DATA_DIR):
+        self.data_dir = Path(data_dir)
+        if not self.data_dir.exists():
+            print("Creating directory: ", self.data_dir.as_posix())
+            self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest = CacheManifest(self.data_dir / f"manifest_{self.name}.sqlite")
+        self.lock_dir = self.data_dir / ".locks"
+        self.lock_dir.mkdir(exist_ok=True)
+        self.thread_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def __reduce__(self):
+        # pickled as its configuration (ex: to hand it to worker processes), reopened on unpickling
+        return type(self), (self.data_dir,)
+
+    @contextmanager
+    def game_lock(self, game_id):
+        """hold the write lock of a game, shared by the threads and the processes using the directory
+
+        Writers (and the removal of corrupted games) take it so that a game and its manifest
+        entry are always updated together. Locks are striped over LOCK_STRIPES files.
+
+        Args:
+            game_id (int): the game id
+        """
+        stripe = int(game_id) % LOCK_STRIPES
+        with self.thread_locks[stripe]:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_dir / f"{stripe}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @abstractmethod
+    def read(self, game_id) -> Optional[bytes]:
+        """read the serialized json of a game, None if it is not stored"""
+
+    @abstractmethod
+    def write(self, game_id, payload: bytes):
+        """write the serialized json of a game"""
+
+    @abstractmethod
+    def delete(self, game_id):
+        """delete a game (no-op if the game is not stored)"""
+
+    @abstractmethod
+    def stored_ids(self) -> List[int]:
+        """list the games physically present in the store"""
+
+    def contains(self, game_id) -> bool:
+        """check if a game is cached (manifest lookup, the game itself is not read)
+
+        Args:
+            game_id (int): the game id
+
+        Returns:
+            bool: True if the game is cached
+        """
+        return self.manifest.get(game_id) is not None
+
+    def load(self, game_id, verbose: bool = False, fields: Optional[Iterable[str]] = None) -> Optional[dict]:
+        """load a stored game, a corrupted entry is removed and treated as missing
+
+        Args:
+            game_id (int): the game id
+            verbose (bool): print information about the cache
+            fields (Optional[Iterable[str]]): only materialize these paths of the json (see `decode_payload`)
+
+        Returns:
+            Optional[dict]: the play by play json or None if the game is not stored
+        """
+        payload = self.read(game_id)
+        if payload is None:
+            return None
+        if verbose:
+            print("Using cached data for game id: ", game_id)
+        entry = self.manifest.get(game_id)
+        if entry is not None and entry.size == len(payload) and entry.checksum == checksum(payload):
+            try:  # payload verified by its checksum
+                return decode_payload(payload, fields)
+            except (JSONDecodeError, UnicodeDecodeError):
+                pass
+        # unindexed, mismatching or undecodable: a concurrent writer may have replaced the game
+        # between the read and the manifest lookup, so check again while holding the game lock
+        with self.game_lock(game_id):
+            payload = self.read(game_id)
+            if payload is None:
+                return None
+            entry = self.manifest.get(game_id)
+            data = None
+            if entry is not None and (entry.size != len(payload) or entry.checksum != checksum(payload)):
+                print(f"Checksum mismatch for game ID: {game_id}")
+            else:
+                try:
+                    data = decode_payload(payload)
+                except (JSONDecodeError, UnicodeDecodeError):
+                    print(f"Error decoding JSON for game ID: {game_id}")
+                if data and entry is None:  # game cached before the manifest existed
+                    self.manifest.record(game_id, payload, data.get("gameState"))
+            if data:
+                return data if fields is None else project(data, fields)
+            # game is present but corrupted: remove it, and redownload
+            if verbose:
+                print("Removing corrupted game: ", game_id)
+            self.delete(game_id)
+            self.manifest.remove(game_id)
+        return None
+
+    def save(
+        self,
+        game_id,
+        data: dict,
+        fetched_at: Optional[float] = None,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ):
+        """store a game (overwriting any previous version) and record it in the manifest
+
+        Args:
+            game_id (int): the game id
+            data (dict): the play by play json
+            fetched_at (Optional[float]): fetch timestamp (defaults to now)
+            etag (Optional[str]): ETag header of the response the game was fetched from
+            last_modified (Optional[str]): Last-Modified header of the response the game was fetched from
+        """
+        payload = json.dumps(data).encode("utf-8")
+        with self.game_lock(game_id):
+            self.write(game_id, payload)
+            self.manifest.record(game_id, payload, data.get("gameState"), fetched_at, etag, last_modified)
+            self.manifest.remove_tombstone(game_id)
+
+    def remove(self, game_id):
+        """remove a game from the store and the manifest (no-op if the game is not stored)
+
+        Args:
+            game_id (int): the game id
+        """
+        with self.game_lock(game_id):
+            self.delete(game_id)
+            self.manifest.remove(game_id)
+
+    def game_ids(self, season=None) -> List[int]:
+        """list the cached games (manifest lookup)
+
+        Args:
+            season (Optional[int]): restrict to a season (ex: 2022)
+
+        Returns:
+            List[int]: the sorted cached game ids
+        """
+        return self.manifest.game_ids(season)
+
+    def missing(self, game_ids: Iterable[int]) -> List[int]:
+        """find the games that are not cached (manifest lookup)
+
+        Args:
+            game_ids (Iterable[int]): the expected game ids
+
+        Returns:
+            List[int]: the expected game ids that are not cached
+        """
+        return self.manifest.missing(game_ids)
+
+    def rebuild_manifest(self, verbose: bool = False) -> int:
+        """index every stored game that is not in the manifest yet (and drop the stale entries)
+
+        Args:
+            verbose (bool): print each indexed game
+
+        Returns:
+            int: the number of indexed games
+        """
+        stored = set(self.stored_ids())
+        for game_id in set(self.manifest.game_ids()) - stored:
+            self.manifest.remove(game_id)
+        indexed = 0
+        for game_id in sorted(stored):
+            if self.manifest.get(game_id) is None and self.load(game_id) is not None:
+                indexed += 1
+                if verbose:
+                    print("Indexed game id: ", game_id)
+        return indexed
+
+
+class JsonDirectoryStore(RawStore):
+    """one uncompressed `{game_id}.json` file per game (original layout of raw_data)"""
+
+    name = "json"
+
+    def file_path(self, game_id) -> str:
+        return f"{self.data_dir.as_posix()}/{game_id}.json"
+
+    def read(self, game_id) -> Optional[bytes]:
+        try:
+            with open(self.file_path(game_id), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, game_id, payload: bytes):
+        # write a temporary file and rename it so readers never see a partially written game
+        fd, tmp_path = tempfile.mkstemp(dir=self.data_dir, prefix=f".{game_id}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(payload)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.file_path(game_id))
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.remove(tmp_path)
+            raise
+
+    def delete(self, game_id):
+        try:
+            os.remove(self.file_path(game_id))
+        except FileNotFoundError:
+            pass
+
+    def stored_ids(self) -> List[int]:
+        return sorted(
+            int(path.stem) for path in self.data_dir.glob("*.json") if path.stem.isdigit()
+        )
+
+
+class SeasonShardStore(RawStore):
+    """one compressed shard per season: `{season}.sqlite` holds zlib compressed games indexed by id
+
+    The game id is the primary key of the shard, so a lookup is an index seek and a single
+    read of the compressed payload instead of an open/parse of a standalone file.
+    """
+
+    name = "sharded"
+
+    def __init__(self, data_dir=RAW_DATA_DIR, compression_level: int = 6):
+        super().__init__(data_dir)
+        self.compression_level = compression_level
+        self.initialized = set()
+
+    def __reduce__(self):
+        return type(self), (self.data_dir, self.compression_level)
+
+    def shard_path(self, season) -> Path:
+        return self.data_dir / f"{season}.sqlite"
+
+    def connect(self, game_id) -> sqlite3.Connection:
+        """open the shard of the season of a game (creating it if needed)"""
+        return self.connect_season(game_season(game_id))
+
+    def connect_season(self, season: int) -> sqlite3.Connection:
+        """open the shard of a season (creating it if needed)"""
+        connection = sqlite3.connect(self.shard_path(season), timeout=60)
+        if season not in self.initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS games (game_id INTEGER PRIMARY KEY, data BLOB NOT NULL)"
+            )
+            connection.commit()
+            self.initialized.add(season)
+        return connection
+
+    def read(self, game_id) -> Optional[bytes]:
+        if not self.shard_path(game_season(game_id)).exists():
+            return None
+        with closing(self.connect(game_id)) as connection:
+            row = connection.execute(
+                "SELECT data FROM games WHERE game_id = ?", (int(game_id),)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return zlib.decompress(row[0])
+        except zlib.error:
+            return b""  # undecodable blob, reported as corrupted by `load`
+
+    def write(self, game_id, payload: bytes):
+        blob = zlib.compress(payload, self.compression_level)
+        with closing(self.connect(game_id)) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO games (game_id, data) VALUES (?, ?)", (int(game_id), blob)
+            )
+
+    def delete(self, game_id):
+        if not self.shard_path(game_season(game_id)).exists():
+            return
+        with closing(self.connect(game_id)) as connection, connection:
+            connection.execute("DELETE FROM games WHERE game_id = ?", (int(game_id),))
+
+    def stored_ids(self) -> List[int]:
+        game_ids = []
+        for shard in sorted(self.data_dir.glob("*.sqlite")):
+            if not shard.stem.isdigit():
+                continue
+            with closing(self.connect_season(int(shard.stem))) as connection:
+                game_ids += [row[0] for row in connection.execute("SELECT game_id FROM games")]
+        return sorted(game_ids)
+
+
+RAW_STORES: Dict[str, type] = {
+    JsonDirectoryStore.name: JsonDirectoryStore,
+    SeasonShardStore.name: SeasonShardStore,
+}
+
+
+def make_raw_store(name: str, data_dir=RAW_DATA_DIR) -> RawStore:
+    """build a raw store backend from its name
+
+    Args:
+        name (str): the backend name (one of RAW_STORES)
+        data_dir (str | Path): the directory holding the data
+
+    Returns:
+        RawStore: the backend
+    """
+    try:
+        return RAW_STORES[name](data_dir)
+    except KeyError:
+        raise ValueError(f"Unknown raw store {name}, expected one of {list(RAW_STORES)}")
+
+
+def migrate(source: RawStore, destination: RawStore, remove_source: bool = False, verbose: bool = False) -> int:
+    """copy every game of a store into another one
+
+    Args:
+        source (RawStore): the store to read from
+        destination (RawStore): the store to write to
+        remove_source (bool): remove each game from the source once it is copied
+        verbose (bool): print each migrated game
+
+    Returns:
+        int: the number of migrated games
+    """
+    migrated = 0
+    for game_id in source.stored_ids():
+        data = source.load(game_id)
+        if data is None:
+            continue
+        entry = source.manifest.get(game_id)
+        if entry is None:
+            destination.save(game_id, data)
+        else:
+            destination.save(game_id, data, entry.fetched_at, entry.etag, entry.last_modified)
+        if remove_source:
+            source.remove(game_id)
+        migrated += 1
+        if verbose:
+            print("Migrated game id: ", game_id)
+    return migrated
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="migrate the raw play by play data between storage backends or index it")
+    parser.add_argument("--source", default=JsonDirectoryStore.name, choices=list(RAW_STORES))
+    parser.add_argument("--destination", default=SeasonShardStore.name, choices=list(RAW_STORES))
+    parser.add_argument("--source-dir", default=RAW_DATA_DIR)
+    parser.add_argument("--destination-dir", default=None, help="defaults to the source directory")
+    parser.add_argument("--remove-source", action="store_true", help="delete the migrated games from the source")
+    parser.add_argument("--rebuild-manifest", action="store_true", help="only index the source store in its manifest")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    if args.rebuild_manifest:
+        indexed = make_raw_store(args.source, args.source_dir).rebuild_manifest(verbose=args.verbose)
+        print(f"Indexed {indexed} games in the {args.source} manifest")
+        return
+    if args.source == args.destination and args.destination_dir is None:
+        parser.error("source and destination are the same store")
+    source = make_raw_store(args.source, args.source_dir)
+    destination = make_raw_store(args.destination, args.destination_dir or args.source_dir)
+    migrated = migrate(source, destination, remove_source=args.remove_source, verbose=args.verbose)
+    print(f"Migrated {migrated} games from {args.source} to {args.destination}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from .game import Game
 from .event_types import ShotsEvent, Goal, ShotOnGoal
 from .player import Player
-from .preprocess import extract_player_data, import_game_stats, game_stats_to_table, games_to_table
+from .preprocess import extract_player_data, import_game_stats, game_stats_to_table, games_to_table, games_to_table_columnar, games_to_table_chunks, write_table_chunks
 from .preprocess_II import PreprocessII
+from .context import ProcessingContext
 from .feature_engineering_II import FeatureEngineeringII
\ No newline at end of file
@@ -0,0 +1,155 @@
+import io
+import copy
+import time
+import argparse
+import tracemalloc
+import contextlib
+import pandas as pd
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional
+from ift6758.data.benchmark_utils import load_game_ids, open_store, store_arguments
+from .context import ProcessingContext
+from .preprocess import games_to_table, games_to_table_columnar, import_game_stats
+from .utilities import JsonToObject
+from .event_types import Event, ShotsEvent, ShotOnGoal, Goal
+
+
+class LegacyEvent(JsonToObject):
+    """an event holding its attributes in a per-instance dict"""
+
+
+def legacy_attributes(event_json: Dict[str, Any], keys: List[str], strip: str, prefix: str = "") -> Dict[str, Any]:
+    """extract the attributes of an event the step by step way (parse_json, then renaming)"""
+    obj = LegacyEvent()
+    obj.setattr(event_json, keys)
+    obj.stripAttribute(strip)
+    if prefix:
+        obj.addPrefix(prefix)
+    return obj.to_dict()
+
+
+def benchmark_extraction(plays: List[Dict[str, Any]], repeat: int = 3) -> List[Dict[str, float]]:
+    """compare the per-event cost of the step by step and the compiled attribute extraction
+
+    Args:
+        plays (List[Dict[str, Any]]): the events of the play by play json
+        repeat (int): number of passes over the events (the best one is kept)
+
+    Returns:
+        List[Dict[str, float]]: per class, the cost in microseconds per event of both extractions
+    """
+    cases = [
+        ("Event (previous)", Event.attributes, "details_", "prev_", Event.prev_extractor),
+        ("Event", Event.attributes, "details_", "", Event.extractor),
+        ("ShotsEvent", ShotsEvent.attributes, "details_", "", ShotsEvent.extractor),
+        ("ShotOnGoal", ShotOnGoal.attributes, "details_", "", ShotOnGoal.extractor),
+        ("Goal", Goal.attributes, "details_", "", Goal.extractor),
+    ]
+    reports = []
+    for name, keys, strip, prefix, extractor in cases:
+        for event_json in plays:  # both ways must produce the same attributes, in the same order
+            legacy = legacy_attributes(event_json, keys, strip, prefix)
+            assert list(legacy.items()) == list(extractor.extract(event_json).items()), (name, event_json)
+        timings = []
+        for extract in (lambda e: legacy_attributes(e, keys, strip, prefix), extractor.extract):
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for event_json in plays:
+                    extract(event_json)
+                best = min(best, time.perf_counter() - start)
+            timings.append(best / len(plays) * 1e6)
+        reports.append({"class": name, "legacy_us": timings[0], "compiled_us": timings[1]})
+    return reports
+
+
+def measure_shots_memory(game_ids: Iterable[int]) -> Dict[str, float]:
+    """measure with tracemalloc the memory held by the shots of some games
+
+    The slotted events are compared with the same attributes held in per-instance dicts
+    (the layout the events had before they declared `__slots__`). Both layouts share the
+    attribute values, so only the memory of the records themselves is compared.
+
+    Args:
+        game_ids (Iterable[int]): the games to import
+
+    Returns:
+        Dict[str, float]: number of shots, retained MB after the import, and bytes per record of both layouts
+    """
+    context = ProcessingContext()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    for game_id in game_ids:
+        import_game_stats(game_id, context=context)
+    context.previous_event = None
+    retained = tracemalloc.get_traced_memory()[0] - start
+    shots = [shot for game_shots in context.shots_by_game.values() for shot in game_shots]
+    sizes = []
+    for layout in (copy.copy, lambda shot: SimpleNamespace(**shot.to_dict())):
+        start = tracemalloc.get_traced_memory()[0]
+        records = [layout(shot) for shot in shots]
+        sizes.append((tracemalloc.get_traced_memory()[0] - start) / len(shots))
+        del records
+    tracemalloc.stop()
+    return {"shots": len(shots), "retained_mb": retained / 2**20, "slotted_bytes": sizes[0], "dict_bytes": sizes[1]}
+
+
+def benchmark_table(game_ids: List[int], repeat: int = 3) -> Dict[str, float]:
+    """compare `games_to_table` (event objects) with its columnar fast path, checking both give the same table
+
+    Args:
+        game_ids (List[int]): the games of the table
+        repeat (int): number of runs (the best one is kept)
+
+    Returns:
+        Dict[str, float]: number of rows and seconds taken by both builders
+    """
+    report = {}
+    tables = []
+    for name, builder in (("objects_s", games_to_table), ("columnar_s", games_to_table_columnar)):
+        best = float("inf")
+        for _ in range(repeat):
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                table = builder(game_ids, context=ProcessingContext())
+                best = min(best, time.perf_counter() - start)
+        report[name] = best
+        tables.append(table.drop(columns=["game", "prev_game"]))
+    pd.testing.assert_frame_equal(tables[0], tables[1])
+    report["rows"] = len(tables[0])
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="micro-benchmark of the event attribute extraction")
+    store_arguments(parser, limit=100)
+    parser.add_argument("--memory", action="store_true", help="also measure the memory held by the shots")
+    parser.add_argument("--table", action="store_true", help="also time the object and the columnar table builders")
+    args = parser.parse_args(argv)
+
+    store = open_store(args, use=True)
+    game_ids = load_game_ids(args, store)
+    plays = []
+    for game_id in game_ids:
+        plays += store.load(game_id, fields=["plays"])["plays"]
+    if not plays:
+        parser.error(f"no event found in {args.data_dir}")
+
+    print(f"{len(plays)} events")
+    print(f"{'class':<20}{'legacy us/event':>18}{'compiled us/event':>20}{'speedup':>10}")
+    for report in benchmark_extraction(plays):
+        speedup = report["legacy_us"] / report["compiled_us"]
+        print(f"{report['class']:<20}{report['legacy_us']:>18.2f}{report['compiled_us']:>20.2f}{speedup:>9.1f}x")
+
+    if args.table:
+        report = benchmark_table(game_ids)
+        print(f"{report['rows']} rows: games_to_table {report['objects_s']:.3f}s, columnar {report['columnar_s']:.3f}s")
+    if args.memory:
+        report = measure_shots_memory(game_ids)
+        print(f"{report['shots']} shots, {report['retained_mb']:.1f} MB retained after the import")
+        print(f"{'slotted record':<20}{report['slotted_bytes']:>8.0f} bytes/shot")
+        print(f"{'per-instance dict':<20}{report['dict_bytes']:>8.0f} bytes/shot")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import io
+import time
+import argparse
+import contextlib
+from typing import Dict, List, Optional
+import pandas as pd
+from ift6758.data.benchmark_utils import load_game_ids, open_store, store_arguments
+from .context import ProcessingContext
+from .preprocess_II import PreprocessII, apply_schema
+from .feature_engineering_II import FeatureEngineeringII
+# the row by row reference is a test helper, not part of the package: run from the project directory
+from tests.legacy_feature_engineering import STEPS, LegacyFeatureEngineeringII
+
+
+SERVING_COLUMNS = ['game_id', 'event_id', 'owner_team_id', 'distance_from_net', 'angle_from_net', 'empty_net', 'labels']
+
+
+def compare_steps(df : pd.DataFrame) -> Dict[str, Dict[str, float]]:
+    """run every step with the vectorized and the row by row implementation, checking both give the same frame
+
+    Args:
+        df (pd.DataFrame): frame of `PreprocessII` (with its missing values already replaced)
+
+    Returns:
+        Dict[str, Dict[str, float]]: step -> seconds taken by both implementations
+    """
+    reports = {}
+    for name, step in STEPS.items():
+        frames, seconds = [], []
+        for klass in (LegacyFeatureEngineeringII, FeatureEngineeringII):
+            fe = klass(df)
+            start = time.perf_counter()
+            step(fe)
+            seconds.append(time.perf_counter() - start)
+            frames.append(fe.df)
+        pd.testing.assert_frame_equal(frames[0], frames[1], check_dtype=False)  # apply infers the default types, the vectorized steps keep the compact ones
+        reports[name] = {"legacy_s": seconds[0], "vectorized_s": seconds[1]}
+    return reports
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="check and time the vectorized FeatureEngineeringII steps")
+    store_arguments(parser, limit=1400)
+    args = parser.parse_args(argv)
+
+    game_ids = load_game_ids(args, open_store(args, use=True))
+    context = ProcessingContext(release_after_emit=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        frames = [PreprocessII.get_game_frame(game_id, context=context) for game_id in game_ids]
+    if not frames:
+        parser.error(f"no shot found in {args.data_dir}")
+    fe = FeatureEngineeringII(pd.concat(frames, ignore_index=True), compact=False)
+    fe.replace_na()
+    df = fe.df
+
+    compact_df = apply_schema(df)
+    megabytes = [frame.memory_usage(deep=True).sum() / 2**20 for frame in (df, compact_df)]
+    print(f"{len(df)} shots, {megabytes[0]:.2f} MB, {megabytes[1]:.2f} MB with the compact types")
+    for name, report in compare_steps(df).items():
+        speedup = report["legacy_s"] / report["vectorized_s"]
+        print(f"{name:<28} row by row {report['legacy_s']:.4f}s, vectorized {report['vectorized_s']:.4f}s ({speedup:.0f}x), same frame")
+    columns = [column for column in df.columns if column not in ("game_id", "event_id")] + ["labels", "current_x", "current_y", "prev_x", "prev_y", "empty_net"]
+    columns.remove("event_type")
+    columns.remove("shot_type")
+    for name, requested in (("all columns", columns), ("serving columns", SERVING_COLUMNS)):
+        frames, seconds = [], []
+        for klass in (LegacyFeatureEngineeringII, FeatureEngineeringII):
+            fe = klass(df)
+            start = time.perf_counter()
+            fe.clean_df(columns=requested)
+            seconds.append(time.perf_counter() - start)
+            frames.append(fe.df)
+        pd.testing.assert_frame_equal(frames[0], frames[1], check_dtype=False)  # apply infers the default types, the vectorized steps keep the compact ones
+        steps = [step.name for step in FeatureEngineeringII(df).feature_plan(requested)[0]]
+        print(f"clean_df ({name}): eager {seconds[0]:.4f}s, planned {seconds[1]:.4f}s, same frame, steps: {', '.join(steps)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import io
+import time
+import argparse
+import contextlib
+from typing import Dict, List, Optional
+import numpy as np
+from ift6758.data.benchmark_utils import load_game_ids, open_store, store_arguments
+from .context import ProcessingContext
+from .preprocess_II import PreprocessII, Row, compute_shot_geometry
+
+GEOMETRY_INPUTS = [
+    "x_coord",
+    "y_coord",
+    "last_event_xCoord",
+    "last_event_yCoord",
+    "owner_team_id",
+    "home_team_id",
+    "home_team_side",
+    "rebound",
+    "time_passed_since_last_event",
+]
+
+
+def per_row_geometry(rows: List[Row]) -> Dict[str, np.ndarray]:
+    """compute the geometry features row by row with the `Row` methods
+
+    Args:
+        rows (List[Row]): rows whose home team side is determined
+
+    Returns:
+        Dict[str, np.ndarray]: feature -> values (NaN where missing)
+    """
+    for row in rows:
+        row.distance_from_last_event = None
+        if not (row.last_event_xCoord is None or row.last_event_yCoord is None):
+            row.compute_distance_from_last_event()
+        row.distance_from_net = row.angle_from_net = row.speed = row.change_in_shot_angle = None
+        row.set_home_team_side(row.home_team_side)
+    names = ["distance_from_last_event", "distance_from_net", "angle_from_net", "speed", "change_in_shot_angle"]
+    return {name: np.array([getattr(row, name) for row in rows], dtype=float) for name in names}
+
+
+def season_arrays(rows: List[Row]) -> List[np.ndarray]:
+    """gather the inputs of `compute_shot_geometry` for all the rows
+
+    Args:
+        rows (List[Row]): rows whose home team side is determined
+
+    Returns:
+        List[np.ndarray]: the input arrays, in the order of `GEOMETRY_INPUTS`
+    """
+    arrays = [np.array([getattr(row, name) for row in rows], dtype=float) for name in GEOMETRY_INPUTS[:4]]  # None -> NaN
+    return arrays + [np.array([getattr(row, name) for row in rows]) for name in GEOMETRY_INPUTS[4:]]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="compare the per-row and the vectorized geometry features")
+    store_arguments(parser, limit=1400)
+    args = parser.parse_args(argv)
+
+    game_ids = load_game_ids(args, open_store(args, use=True))
+    rows = []
+    context = ProcessingContext(release_after_emit=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for game_id in game_ids:
+            rows += PreprocessII(game_id, context=context, bulk=True).game_data
+    if not rows:
+        parser.error(f"no shot found in {args.data_dir}")
+
+    start = time.perf_counter()
+    arrays = season_arrays(rows)
+    gather_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    vectorized = compute_shot_geometry(*arrays)
+    vectorized_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    reference = per_row_geometry(rows)
+    per_row_seconds = time.perf_counter() - start
+
+    print(f"{len(rows)} shots: per row {per_row_seconds:.4f}s, vectorized {vectorized_seconds:.4f}s (+{gather_seconds:.4f}s to gather the arrays)")
+    for name, expected in reference.items():
+        same_missing = (np.isnan(expected) == np.isnan(vectorized[name])).all()
+        difference = np.nanmax(np.abs(expected - vectorized[name]), initial=0)
+        print(f"{name:<26} same missing values: {same_missing}, max difference: {difference:.2e}")
+        assert same_missing and difference < 1e-9, name
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import io
+import time
+import argparse
+import contextlib
+from typing import Callable, List, Optional
+import numpy as np
+import pandas as pd
+from ift6758.data.benchmark_utils import load_game_ids, open_store, store_arguments
+from .context import ProcessingContext
+from .preprocess import games_to_table_columnar
+from .team_side import resolve_home_team_defending_sides
+from .trigonometry import compute_distance_from_net, compute_angle_from_net, compute_distances_from_net, compute_angles_from_net
+
+TRIGONOMETRY_COLUMNS = ["xCoord", "yCoord", "eventOwnerTeamId", "homeTeam_id", "homeTeamDefendingSide"]
+
+
+def best_time(function: Callable, repeat: int = 3) -> float:
+    """get the best of `repeat` runs of a function, in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def events_frame(game_ids: List[int]) -> pd.DataFrame:
+    """build the events of some games with their home team defending side
+
+    Args:
+        game_ids (List[int]): the games (of one or many seasons)
+
+    Returns:
+        pd.DataFrame: the events with a coordinate and a resolved home team defending side
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = games_to_table_columnar(game_ids, context=ProcessingContext(release_after_emit=True))
+    df["homeTeamDefendingSide"] = None
+    df, _, _ = resolve_home_team_defending_sides(df)
+    return df[df["xCoord"].notna() & df["homeTeamDefendingSide"].notna()].reset_index(drop=True)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="compare the row and the vectorized distance/angle from the net")
+    store_arguments(parser, limit=1400)
+    args = parser.parse_args(argv)
+
+    df = events_frame(load_game_ids(args, open_store(args, use=True)))
+    if df.empty:
+        parser.error(f"no event found in {args.data_dir}")
+    columns = [df[column] for column in TRIGONOMETRY_COLUMNS]
+
+    seasons = df["season"].nunique()
+    print(f"{len(df)} events of {seasons} season(s)")
+    for name, row_function, array_function in (
+        ("distance_from_net", compute_distance_from_net, compute_distances_from_net),
+        ("angle_from_net", compute_angle_from_net, compute_angles_from_net),
+    ):
+        expected = df.apply(row_function, axis=1).to_numpy(dtype=float)
+        vectorized = array_function(*columns)
+        difference = np.nanmax(np.abs(expected - vectorized), initial=0)
+        assert np.array_equal(np.isnan(expected), np.isnan(vectorized)) and difference < 1e-9, name
+        row_seconds = best_time(lambda: df.apply(row_function, axis=1), repeat=1)
+        array_seconds = best_time(lambda: array_function(*columns))
+        print(f"{name:<18} apply {row_seconds:.4f}s, vectorized {array_seconds:.4f}s ({row_seconds / array_seconds:.0f}x), max difference: {difference:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+
+class ProcessingContext:
+    """registries used while turning play by play json into events and tables
+
+    A context owns the games created so far, the shots of each game and the last non-shot event
+    seen (copied into the next shots as their previous event). Each preprocessing job can use its
+    own context, so several jobs can run side by side, and memory can be bounded:
+
+    Args:
+        max_games (Optional[int]): keep at most this many games (least recently used ones are evicted with their shots)
+        release_after_emit (bool): forget a game and its shots as soon as its table rows have been emitted
+    """
+
+    def __init__(self, max_games: Optional[int] = None, release_after_emit: bool = False):
+        if max_games is not None and max_games < 1:
+            raise ValueError(f"max_games must be at least 1. Got {max_games}")
+        self.max_games = max_games
+        self.release_after_emit = release_after_emit
+        self.games: "OrderedDict[int, Any]" = OrderedDict()
+        self.shots_by_game: Dict[int, List[Any]] = {}
+        self.previous_event = None
+
+    def __enter__(self) -> "ProcessingContext":
+        self.token = _current_context.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _current_context.reset(self.token)
+
+    def get_game(self, game_id: int):
+        """get a registered game (marking it as recently used)
+
+        Args:
+            game_id (int): the game id
+
+        Raises:
+            KeyError: if the game is not registered
+
+        Returns:
+            Game: the game
+        """
+        game = self.games[game_id]
+        self.games.move_to_end(game_id)
+        return game
+
+    def add_game(self, game_id: int, game):
+        """register a game, evicting the least recently used ones above `max_games`
+
+        Args:
+            game_id (int): the game id
+            game (Game): the game
+        """
+        self.games[game_id] = game
+        self.games.move_to_end(game_id)
+        while self.max_games is not None and len(self.games) > self.max_games:
+            evicted, _ = self.games.popitem(last=False)
+            self.shots_by_game.pop(evicted, None)
+
+    def reset_shots(self, game_id: int):
+        """forget the shots of a game before (re)importing it
+
+        Args:
+            game_id (int): the game id
+        """
+        self.shots_by_game[game_id] = []
+
+    def add_shot(self, game_id: int, shot):
+        """register a shot of a game
+
+        Args:
+            game_id (int): the game id
+            shot (ShotsEvent): the shot
+        """
+        try:
+            self.shots_by_game[game_id].append(shot)
+        except KeyError:
+            self.shots_by_game[game_id] = [shot]
+
+    def get_shots(self, game_id: int) -> List[Any]:
+        """get the shots of a game
+
+        Args:
+            game_id (int): the game id
+
+        Raises:
+            KeyError: if the game has no registered shot
+
+        Returns:
+            List[ShotsEvent]: the shots
+        """
+        return self.shots_by_game[game_id]
+
+    def release(self, game_id: int):
+        """forget a game and its shots
+
+        Args:
+            game_id (int): the game id
+        """
+        self.games.pop(game_id, None)
+        self.shots_by_game.pop(game_id, None)
+
+    def emitted(self, game_id: int):
+        """signal that the table rows of a game were produced (releases it in `release_after_emit` mode)
+
+        Args:
+            game_id (int): the game id
+        """
+        if self.release_after_emit:
+            self.release(game_id)
+
+    def clear(self):
+        """forget every game, shot and previous event"""
+        self.games.clear()
+        self.shots_by_game.clear()
+        self.previous_event = None
+
+
+default_context = ProcessingContext()
+_current_context: ContextVar[ProcessingContext] = ContextVar("processing_context", default=default_context)
+
+
+def current_context(context: Optional[ProcessingContext] = None) -> ProcessingContext:
+    """resolve the context to use: the given one, else the one entered with `with`, else the default one
+
+    Args:
+        context (Optional[ProcessingContext]): an explicit context
+
+    Returns:
+        ProcessingContext: the context
+    """
+    return context if context is not None else _current_context.get()
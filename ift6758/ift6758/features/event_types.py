@@ -1,8 +1,9 @@
 from ift6758.data import get_data as gd
 from .utilities import *
 from .game import Game
+from .context import ProcessingContext, current_context, default_context
 
-class Event(JsonToObject):
+class Event(JsonRecord):
     
     attributes = [
         "eventId",
@@ -13,19 +14,21 @@ class Event(JsonToObject):
         "periodDescriptor.number",
         "typeDescKey"
     ]
+    extractor = KeyExtractor(attributes, strip="details_")
+    prev_extractor = KeyExtractor(attributes, strip="details_", prefix="prev_")
+    __slots__ = ("game",) + extractor.names + ("prev_game",) + prev_extractor.names
 
-    previous_event: Optional["Event"] = None
-
-    def __init__(self, game: Game, event_json: Dict[str, Any], prev_event : bool = False):
-        self.game = game
-        self.setattr(event_json, Event.attributes)
-        self.stripAttribute("details_")
+    def __init__(self, game: Game, event_json: Dict[str, Any], prev_event : bool = False, context: Optional[ProcessingContext] = None):
+        context = current_context(context)
         if prev_event:
-            self.addPrefix("prev_")
-            Event.previous_event = self
+            self.prev_game = game
+            self.extract(event_json, Event.prev_extractor)
+            context.previous_event = self
         else:
-            for key,value in Event.previous_event.__dict__.items():
-                self.__setattr__(key, value)
+            self.game = game
+            self.extract(event_json, Event.extractor)
+            for key, value in context.previous_event.to_dict().items():
+                setattr(self, key, value)
         
     def get_event_id(self) -> int:
         """get the event id
@@ -67,29 +70,28 @@ class ShotsEvent(Event):
         "details.shotType",
         "details.zoneCode",
     ]
-    shots_by_game: Dict[int, List["ShotsEvent"]] = {}
+    extractor = KeyExtractor(attributes, strip="details_")
+    __slots__ = extractor.names
+    shots_by_game: Dict[int, List["ShotsEvent"]] = default_context.shots_by_game  # registry of the default context
     
-    def __init__(self, game: Game, event_json: Dict[str, Any]):
-        super().__init__(game, event_json)
-        self.setattr(event_json, ShotsEvent.attributes)
-        self.stripAttribute("details_")
-        id = game.get_id()
-        try:
-            ShotsEvent.shots_by_game[id].append(self)
-        except KeyError:
-            ShotsEvent.shots_by_game[id] = [self]
+    def __init__(self, game: Game, event_json: Dict[str, Any], context: Optional[ProcessingContext] = None):
+        context = current_context(context)
+        super().__init__(game, event_json, context=context)
+        self.extract(event_json, ShotsEvent.extractor)
+        context.add_shot(game.get_id(), self)
 
     @staticmethod
-    def get_shots_by_game(game_id: int) -> List["ShotsEvent"]:
+    def get_shots_by_game(game_id: int, context: Optional[ProcessingContext] = None) -> List["ShotsEvent"]:
         """get the events by game id
 
         Args:
             game_id (int): the game id
+            context (Optional[ProcessingContext]): the registry to look into (defaults to the current context)
 
         Returns:
             List['ShotsEvent']: the list of events
         """
-        return ShotsEvent.shots_by_game[game_id]
+        return current_context(context).get_shots(game_id)
     
     
     def approximate_homeTeamSide(self, game : Game) -> str:
@@ -197,12 +199,13 @@ class ShotOnGoal(ShotsEvent):
         "details.shootingPlayerId",
         "situationCode"
     ]
+    extractor = KeyExtractor(attributes, strip="details_")
+    __slots__ = extractor.names
 
-    def __init__(self, game: Game, event_json: Dict[str, Any], verbose: bool = False):
+    def __init__(self, game: Game, event_json: Dict[str, Any], verbose: bool = False, context: Optional[ProcessingContext] = None):
         try:
-            super().__init__(game, event_json)
-            self.setattr(event_json, ShotOnGoal.attributes)
-            self.stripAttribute("details_", verbose=verbose)
+            super().__init__(game, event_json, context=context)
+            self.extract(event_json, ShotOnGoal.extractor, verbose=verbose)
         except KeyError as e:
             print(f"Error in ShotOnGoalEvent: {e}")
 
@@ -216,13 +219,14 @@ class Goal(ShotsEvent):
         "details.scoringPlayerId",
         "situationCode"
     ]
+    extractor = KeyExtractor(attributes, strip="details_")
+    __slots__ = extractor.names
 
-    def __init__(self, game: Game, event_json: Dict[str, Any], verbose: bool = False):
-        super().__init__(game, event_json)
-        self.setattr(event_json, Goal.attributes)
+    def __init__(self, game: Game, event_json: Dict[str, Any], verbose: bool = False, context: Optional[ProcessingContext] = None):
+        super().__init__(game, event_json, context=context)
         if verbose:
             print(event_json)
-        self.stripAttribute("details_", verbose=verbose)
+        self.extract(event_json, Goal.extractor, verbose=verbose)
 
     def __str__(self) -> str:
         return super().__str__()
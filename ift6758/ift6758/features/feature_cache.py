@@ -0,0 +1,207 @@
+import os
+import time
+import pickle
+import sqlite3
+import tempfile
+import importlib
+from pathlib import Path
+from functools import lru_cache
+from contextlib import closing, suppress
+from typing import Callable, Optional
+import pandas as pd
+from ift6758.data import get_data
+from ift6758.data.manifest import checksum
+from ift6758.data.raw_store import RAW_DATA_DIR
+
+FEATURE_CACHE_DIR = RAW_DATA_DIR.parent / "feature_cache"  # next to the raw data directory
+# the modules turning a play by play into rows: editing one of them invalidates the cached rows
+FEATURE_MODULES = [
+    "ift6758.features.utilities",
+    "ift6758.features.game",
+    "ift6758.features.event_types",
+    "ift6758.features.preprocess",
+    "ift6758.features.preprocess_II",
+    "ift6758.features.trigonometry",
+]
+
+
+@lru_cache(maxsize=None)
+def feature_code_version() -> str:
+    """get the version of the feature code: a checksum of the sources of `FEATURE_MODULES`
+
+    Returns:
+        str: the hexadecimal version
+    """
+    sources = b"".join(Path(importlib.import_module(name).__file__).read_bytes() for name in FEATURE_MODULES)
+    return checksum(sources)
+
+
+class FeatureCache:
+    """on-disk cache of the processed rows of games
+
+    A game's frame is stored with the checksum of the raw payload it was built from and the version
+    of the feature code. It is served only while both match: a re-downloaded game or a change of the
+    feature code invalidates it. An SQLite index records the size and last use of each frame, and the
+    least recently used frames are evicted once the cache grows above `max_bytes`.
+
+    Args:
+        directory (str | Path): the directory of the cache (created if needed)
+        max_bytes (int): maximum total size of the cached frames
+        version (Optional[str]): version of the feature code (defaults to `feature_code_version()`)
+    """
+
+    def __init__(self, directory=FEATURE_CACHE_DIR, max_bytes: int = 2**30, version: Optional[str] = None):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.version = version or feature_code_version()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with closing(self.connect()) as connection, connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS frames (game_id INTEGER PRIMARY KEY, checksum TEXT NOT NULL, "
+                "version TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.directory / "index.sqlite", timeout=60)
+
+    def file_path(self, game_id) -> Path:
+        return self.directory / f"{game_id}.pkl"
+
+    @staticmethod
+    def raw_checksum(game_id) -> Optional[str]:
+        """get the checksum of the cached raw payload of a game
+
+        Args:
+            game_id (int): the game id
+
+        Returns:
+            Optional[str]: the checksum or None if the game is not in the raw data cache
+        """
+        entry = get_data.get_raw_store().manifest.get(game_id)
+        return entry.checksum if entry is not None else None
+
+    def get(self, game_id, raw_checksum: Optional[str]) -> Optional[pd.DataFrame]:
+        """get the cached frame of a game, if it was built from this payload by this feature code
+
+        Args:
+            game_id (int): the game id
+            raw_checksum (Optional[str]): the checksum of the raw payload
+
+        Returns:
+            Optional[pd.DataFrame]: the frame or None if it is not cached or outdated
+        """
+        if raw_checksum is None:
+            return None
+        with closing(self.connect()) as connection:
+            row = connection.execute(
+                "SELECT checksum, version FROM frames WHERE game_id = ?", (int(game_id),)
+            ).fetchone()
+        if row is None:
+            return None
+        if row != (raw_checksum, self.version):  # built from another payload or by another feature code
+            self.remove(game_id)
+            return None
+        with closing(self.connect()) as connection, connection:
+            connection.execute("UPDATE frames SET last_used = ? WHERE game_id = ?", (time.time(), int(game_id)))
+        try:
+            with open(self.file_path(game_id), "rb") as file:
+                return pickle.load(file)
+        except Exception:  # missing, truncated or written by another pandas version: build it again
+            self.remove(game_id)
+            return None
+
+    def put(self, game_id, raw_checksum: Optional[str], frame: pd.DataFrame):
+        """cache the frame of a game, then evict the least recently used frames above `max_bytes`
+
+        Args:
+            game_id (int): the game id
+            raw_checksum (Optional[str]): the checksum of the raw payload it was built from (nothing is cached if None)
+            frame (pd.DataFrame): the frame of the game
+        """
+        if raw_checksum is None:
+            return
+        # write a temporary file and rename it so readers never see a partially written frame
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{game_id}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                pickle.dump(frame, file, protocol=pickle.HIGHEST_PROTOCOL)
+                size = file.tell()
+            os.replace(tmp_path, self.file_path(game_id))
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.remove(tmp_path)
+            raise
+        with closing(self.connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO frames (game_id, checksum, version, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                (int(game_id), raw_checksum, self.version, size, time.time()),
+            )
+        self.evict()
+
+    def get_or_build(self, game_id, build: Callable[[int], pd.DataFrame]) -> pd.DataFrame:
+        """get the cached frame of a game, building and caching it if needed
+
+        A game missing from the raw data cache is downloaded and saved before being built, so its
+        frame can be cached (a game that cannot be downloaded is built but not cached).
+
+        Args:
+            game_id (int): the game id
+            build (Callable[[int], pd.DataFrame]): builds the frame of a game
+
+        Returns:
+            pd.DataFrame: the frame
+        """
+        raw_checksum = FeatureCache.raw_checksum(game_id)
+        if raw_checksum is None:
+            # download and save the game first: the frame is keyed on the checksum of the saved payload
+            get_data.retrieve_game_data(game_id, save=True)
+            raw_checksum = FeatureCache.raw_checksum(game_id)
+        frame = self.get(game_id, raw_checksum)
+        if frame is None:
+            frame = build(game_id)
+            self.put(game_id, raw_checksum, frame)
+        return frame
+
+    def remove(self, game_id):
+        """remove the frame of a game (no-op if it is missing)
+
+        Args:
+            game_id (int): the game id
+        """
+        with closing(self.connect()) as connection, connection:
+            connection.execute("DELETE FROM frames WHERE game_id = ?", (int(game_id),))
+        with suppress(FileNotFoundError):
+            os.remove(self.file_path(game_id))
+
+    def size(self) -> int:
+        """get the total size of the cached frames in bytes"""
+        with closing(self.connect()) as connection:
+            return connection.execute("SELECT COALESCE(SUM(size), 0) FROM frames").fetchone()[0]
+
+    def evict(self) -> int:
+        """remove the least recently used frames until the cache fits in `max_bytes`
+
+        Returns:
+            int: the number of frames removed
+        """
+        total = self.size()
+        if total <= self.max_bytes:
+            return 0
+        with closing(self.connect()) as connection:
+            rows = connection.execute("SELECT game_id, size FROM frames ORDER BY last_used").fetchall()
+        removed = 0
+        for game_id, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.remove(game_id)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        """remove every cached frame"""
+        with closing(self.connect()) as connection:
+            game_ids = [row[0] for row in connection.execute("SELECT game_id FROM frames")]
+        for game_id in game_ids:
+            self.remove(game_id)
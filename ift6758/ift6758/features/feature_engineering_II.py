@@ -1,15 +1,66 @@
-from .preprocess_II import PreprocessII
+from .preprocess_II import PreprocessII, apply_schema
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Any, Tuple, Union, Optional, Iterable
+from typing import List, Dict, Any, Tuple, Union, Optional, Iterable, Callable, NamedTuple
+
+
+class FeatureStep(NamedTuple):
+    """a step of `FeatureEngineeringII.clean_df`, declaring the columns it reads and the columns it produces"""
+    name : str
+    run : Callable[["FeatureEngineeringII"], Any]
+    inputs : Tuple[str, ...]
+    outputs : Tuple[str, ...]
+    output_prefix : Optional[str] = None  # the step also produces the columns starting with this prefix (one-hot encoding)
+
+    def produces(self, column : str) -> bool:
+        """check if the step produces a column
+
+        Args:
+            column (str): the column name
+
+        Returns:
+            bool: True if the column is an output of the step
+        """
+        return column in self.outputs or (self.output_prefix is not None and column.startswith(self.output_prefix))
 
 
 class FeatureEngineeringII:
-    def __init__(self, data : Union[pd.DataFrame, Iterable[int]]):
+
+    # the steps of clean_df, in the order they run (a step may read the outputs of the previous ones)
+    FEATURE_STEPS : List[FeatureStep] = [
+        FeatureStep("add_labels", lambda fe: fe.add_labels(), ("event_type",), ("labels",)),
+        FeatureStep("numerise_zoneCode", lambda fe: fe.numerise_zoneCode(one_hot_encode=False), ("zone_code",), ("zone_code",)),
+        FeatureStep("numerise_shotType", lambda fe: fe.numerise_shotType(one_hot_encode=True), ("shot_type",), (), "shot_type_"),
+        FeatureStep(
+            "align_coord",
+            lambda fe: fe.align_coord(),
+            ("owner_team_id", "home_team_id", "home_team_side", "x_coord", "y_coord", "last_event_xCoord", "last_event_yCoord"),
+            ("current_x", "current_y", "prev_x", "prev_y"),
+        ),
+        FeatureStep(
+            "extract_empty_net_feature",
+            lambda fe: fe.extract_empty_net_feature(fe.df),
+            ("situation_code", "owner_team_id", "away_team_id", "home_team_id"),
+            ("empty_net",),
+        ),
+    ]
+
+    def __init__(self, data : Union[pd.DataFrame, Iterable[int]], copy : bool = True, compact : bool = True):
+        """
+        Args:
+            data (Union[pd.DataFrame, Iterable[int]]): the frame of `PreprocessII` or the seasons to build it from
+            copy (bool): deep copy the frame. Otherwise the frame is shared until one of them is modified
+                (copy-on-write, always on from pandas 3, an option before), which saves the memory of a copy
+            compact (bool): cast the columns to the compact types of `FRAME_DTYPES` (narrow integers, float32, categories).
+                The cast gives a new frame, so the frame is only copied when no column is cast
+        """
         self.df = None
         if isinstance(data, pd.DataFrame):
-            self.df = data.copy(deep=True)
+            self.df = apply_schema(data) if compact else data
+            if self.df is data:
+                self.df = data.copy(deep=copy)
         else:
-            self.df = PreprocessII.get_games_df(data)
+            self.df = PreprocessII.get_games_df(data, compact=compact)
         self.irrelevant_columns = ["away_team_id", "flagged", "season"]
         
     def remove_irrelevant_columns(self):
@@ -21,7 +72,7 @@ class FeatureEngineeringII:
     def add_labels(self):
         """add labels to the dataframe
         """
-        self.df['labels'] = self.df['event_type'].apply(lambda x: 1 if x == "goal" else 0)
+        self.df['labels'] = (self.df['event_type'] == "goal").astype(np.int64)
         self.df.drop(columns=["event_type"], inplace=True)
         
     def numerise_column(self, column : str, key_val : Dict[Any, Any], one_hot : bool = False, prefix : str = None):
@@ -35,7 +86,10 @@ class FeatureEngineeringII:
         """
         if one_hot:
             key_val = { i : i for i in key_val.keys() }
-        self.df[column] = self.df[column].apply(lambda x: key_val.get(x, key_val['other']))
+        # the code of a value is the position of its key, -1 (the appended 'other' value) if it is not a key
+        codes = pd.Index(list(key_val.keys())).get_indexer(self.df[column])
+        values = np.array(list(key_val.values()) + [key_val['other']], dtype=None if not one_hot else object)
+        self.df[column] = pd.Series(values[codes], index=self.df.index, name=column)
         if one_hot:
             self.df = pd.get_dummies(self.df, columns=[column], prefix=prefix)
             
@@ -100,10 +154,12 @@ class FeatureEngineeringII:
     def align_coord(self):
         """align the coordinates of the events to the owner team
         """
-        self.df['current_x'] = self.df.apply(lambda x: x['x_coord'] if ((x['owner_team_id'] == x['home_team_id'] and x['home_team_side'] == "left") or (x['owner_team_id'] != x['home_team_id'] and x['home_team_side'] == "right")) else -x['x_coord'], axis=1)
-        self.df['current_y'] = self.df.apply(lambda x: x['y_coord'] if ((x['owner_team_id'] == x['home_team_id'] and x['home_team_side'] == "left") or (x['owner_team_id'] != x['home_team_id'] and x['home_team_side'] == "right")) else -x['y_coord'], axis=1)
-        self.df['prev_x'] = self.df.apply(lambda x: x['last_event_xCoord'] if ((x['owner_team_id'] == x['home_team_id'] and x['home_team_side'] == "left") or (x['owner_team_id'] != x['home_team_id'] and x['home_team_side'] == "right")) else -x['last_event_xCoord'], axis=1)
-        self.df['prev_y'] = self.df.apply(lambda x: x['last_event_yCoord'] if ((x['owner_team_id'] == x['home_team_id'] and x['home_team_side'] == "left") or (x['owner_team_id'] != x['home_team_id'] and x['home_team_side'] == "right")) else -x['last_event_yCoord'], axis=1)
+        same_team = self.df['owner_team_id'] == self.df['home_team_id']
+        # the owner team shoots toward the right net when the home team defends the left one (or the away team the right one)
+        shoots_right = (same_team & (self.df['home_team_side'] == "left")) | (~same_team & (self.df['home_team_side'] == "right"))
+        shoots_right = shoots_right.fillna(False).astype(bool)
+        for aligned, column in (('current_x', 'x_coord'), ('current_y', 'y_coord'), ('prev_x', 'last_event_xCoord'), ('prev_y', 'last_event_yCoord')):
+            self.df[aligned] = self.df[column].where(shoots_right, -self.df[column])
         self.irrelevant_columns += ["x_coord", "y_coord", "last_event_xCoord", "last_event_yCoord","home_team_id", "owner_team_id"]
 
     def split_train_test(self, test_frac=0.2):
@@ -129,8 +185,12 @@ class FeatureEngineeringII:
         """replace the missing values in the dataframe with the mean of the column for numerical columns and the max occurence for categorical columns
         """
         for column in self.df.columns:
-            if self.df[column].dtype == 'float64':
-                self.df[column] = self.df[column].fillna(self.df[column].mean())
+            dtype = self.df[column].dtype
+            if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+                values = self.df[column]
+                if pd.api.types.is_integer_dtype(dtype) and values.hasnans:
+                    values = values.astype("float64")  # a nullable integer column of the compact types, a float one without them
+                self.df[column] = values.fillna(values.mean())
             else:
                 try:
                     self.df[column] = self.df[column].fillna(self.df[column].value_counts().idxmax())
@@ -158,43 +218,53 @@ class FeatureEngineeringII:
         Returns:
             pd.DataFrame: DataFrame with the empty net feature added.
         """
-        def is_empty_net(row):
-            situation_code = str(row['situation_code']).zfill(4)
-            event_owner_team_id = row['owner_team_id']
-            
-            # Parse the situation code
-            away_goalie_on_ice = situation_code[0] == '1'
-            away_skaters = int(situation_code[1])
-            home_skaters = int(situation_code[2])
-            home_goalie_on_ice = situation_code[3] == '1'
-            
-            # Determine if the goal was scored into an empty net
-            if event_owner_team_id == row['away_team_id']:
-                # Away team scored
-                return 1 if not home_goalie_on_ice else 0
-            elif event_owner_team_id == row['home_team_id']:
-                # Home team scored
-                return 1 if not away_goalie_on_ice else 0
-            else:
-                return 0
-
-        # Apply the function to each row
-        df['empty_net'] = df.apply(is_empty_net, axis=1)
+        # decode the situation code (away goalie, away skaters, home skaters, home goalie) as an integer
+        situation_code = pd.to_numeric(df['situation_code'].to_numpy())
+        away_goalie_on_ice = situation_code // 1000 == 1
+        home_goalie_on_ice = situation_code % 10 == 1
         
-        # Fill NaNs with 0
-        df['empty_net'] = df['empty_net'].fillna(0)
+        # Determine if the goal was scored into an empty net
+        away_scored = (df['owner_team_id'] == df['away_team_id']).to_numpy(dtype=bool, na_value=False)
+        home_scored = ~away_scored & (df['owner_team_id'] == df['home_team_id']).to_numpy(dtype=bool, na_value=False)
+        empty_net = (away_scored & ~home_goalie_on_ice) | (home_scored & ~away_goalie_on_ice)
+        df['empty_net'] = empty_net.astype(np.int64)
         return df
 
+    def feature_plan(self, columns : Optional[List[str]] = None) -> Tuple[List[FeatureStep], List[str]]:
+        """get the steps needed to compute some columns and the source columns they read
+
+        Args:
+            columns (Optional[List[str]]): the requested columns (None for all of them)
+
+        Returns:
+            Tuple[List[FeatureStep], List[str]]: the steps to run (in order) and the columns of the dataframe to keep
+        """
+        if columns is None:
+            return list(self.FEATURE_STEPS), list(self.df.columns)
+        needed = set(columns)
+        steps = []
+        for step in reversed(self.FEATURE_STEPS):  # from the last step so the inputs of a step come before its producers
+            if any(step.produces(column) for column in needed):
+                steps.insert(0, step)
+                needed.update(step.inputs)
+        return steps, [column for column in self.df.columns if column in needed]
+
     def clean_df(self, remove_irrelevant=False, columns=None):    
         """clean the dataframe by removing irrelevant columns, adding labels, numerising the columns and aligning the coordinates
+
+        When columns are requested, only the steps producing them run, on the source columns they need.
+
+        Args:
+            remove_irrelevant (bool, optional): remove the irrelevant columns. Defaults to False.
+            columns (Optional[List[str]], optional): the columns to keep (None to keep all of them). Defaults to None.
         """
+        steps, sources = self.feature_plan(columns)
+        if len(sources) < len(self.df.columns):
+            self.df = self.df[sources]
         self.replace_na()
-        self.add_labels()
-        self.numerise_zoneCode(one_hot_encode=False)
-        self.numerise_shotType(one_hot_encode=True)
-        # self.numerise_previous_event(one_hot_encode=True)
-        self.align_coord()
-        self.extract_empty_net_feature(self.df)
-        self.keep_columns(columns)
+        for step in steps:
+            step.run(self)
+        if columns is not None:
+            self.keep_columns(columns)
         if remove_irrelevant:
             self.remove_irrelevant_columns()
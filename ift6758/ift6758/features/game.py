@@ -1,10 +1,11 @@
 from .utilities import *
+from .context import ProcessingContext, current_context, default_context
 from ift6758.data import get_data as gd
 
 
 class Game(JsonToObject):
 
-    games = {}
+    games = default_context.games  # registry of the default context, see ProcessingContext
     attribute = [
         "id",
         "gameDate",
@@ -16,10 +17,11 @@ class Game(JsonToObject):
         "awayTeam.id",
         "homeTeam.id",
     ]
+    extractor = KeyExtractor(attribute)
 
-    def __init__(self, play_by_play: dict, verbose: bool = False):
-        self.setattr(play_by_play, Game.attribute, verbose=verbose)
-        Game.games[play_by_play["id"]] = self
+    def __init__(self, play_by_play: dict, verbose: bool = False, context: Optional[ProcessingContext] = None):
+        self.extract(play_by_play, Game.extractor, verbose=verbose)
+        current_context(context).add_game(play_by_play["id"], self)
         if verbose:
             print(f"Game {self.get_id()} created")
             print("with value : ", self.to_dict())
@@ -31,20 +33,29 @@ class Game(JsonToObject):
         return self.__str__()
 
     @staticmethod
-    def get_game(game_id: int, verbose: bool = False) -> Union["Game", None]:
+    def get_game(
+        game_id: int,
+        verbose: bool = False,
+        play_by_play: Optional[dict] = None,
+        context: Optional[ProcessingContext] = None,
+    ) -> Union["Game", None]:
         """get the game object from the game id
 
         Args:
             game_id (int): the game id
+            play_by_play (Optional[dict]): the already loaded play by play json of the game, if any
+            context (Optional[ProcessingContext]): the registry to look into (defaults to the current context)
 
         Returns:
             (Game | None): the game object or None if the game id is not found
         """
+        context = current_context(context)
         try:
-            return Game.games[game_id]
+            return context.get_game(game_id)
         except KeyError:
-            game_data = gd.retrieve_game_data(game_id, verbose=verbose)
-            return Game(game_data, verbose=verbose)
+            if play_by_play is None:
+                play_by_play = gd.retrieve_game_data(game_id, verbose=verbose, fields=Game.attribute)
+            return Game(play_by_play, verbose=verbose, context=context)
 
     def get_id(self) -> int:
         """get game id
@@ -57,7 +68,6 @@ class Game(JsonToObject):
         except AttributeError:
             print("Error: game id not found")
             print(self.to_dict())
-            print(Game.games)
     
     def get_season(self) -> int:
         """get game season
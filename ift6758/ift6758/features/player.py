@@ -3,10 +3,10 @@ from .utilities import *
 class Player(JsonToObject):
 
     attributes = ['playerId', 'teamId', 'firstName.default', 'lastName.default', 'positionCode']
+    extractor = KeyExtractor(attributes, strip='_default')
     
     def __init__(self, rosterSpots : Dict[str, Any]):
-        self.setattr(rosterSpots, Player.attributes)
-        self.stripAttribute('_default')
+        self.extract(rosterSpots, Player.extractor)
         
     def __str__(self) -> str:
         return f"{self.get_first_name()} {self.get_last_name()} ({self.get_position_code()})"
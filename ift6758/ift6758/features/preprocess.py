@@ -1,10 +1,40 @@
+import os
 import ift6758.data.get_data as get_data
 from ift6758.features.utilities import JsonToObject
-from typing import Dict, Any, List, Tuple, Iterable
+from typing import Dict, Any, List, Tuple, Iterable, Iterator, Optional
+import numpy as np
 import pandas as pd
 from ift6758.features.game import Game
 from ift6758.features.player import Player
 from ift6758.features.event_types import ShotsEvent, Goal, ShotOnGoal, Event
+from ift6758.features.context import ProcessingContext, current_context
+
+# the parts of the play by play json used to build the game stats
+GAME_STATS_FIELDS = ["plays", "rosterSpots"] + Game.attribute
+# the parts used by the columnar path (the roster is not part of the table)
+PLAYS_FIELDS = ["plays"] + Game.attribute
+# types of the table columns once written to disk: the same for every chunk (and nullable, any field can be missing)
+TABLE_DTYPES = {
+    **{name: "string" if name in ("timeInPeriod", "typeDescKey", "reason") else "Int64" for name in Event.extractor.names},
+    **{"prev_" + name: "string" if name in ("timeInPeriod", "typeDescKey", "reason") else "Int64" for name in Event.extractor.names},
+    "eventOwnerTeamId": "Int64",
+    "goalieInNetId": "Int64",
+    "shotType": "string",
+    "zoneCode": "string",
+    "situationCode": "string",
+    "shootingPlayerId": "Int64",
+    "id": "Int64",
+    "gameDate": "string",
+    "season": "Int64",
+    "homeTeam_abbrev": "string",
+    "homeTeam_score": "Int64",
+    "awayTeam_abbrev": "string",
+    "awayTeam_score": "Int64",
+    "awayTeam_id": "Int64",
+    "homeTeam_id": "Int64",
+    "type": "string",
+    "scoringPlayerId": "Int64",
+}
 
 def convert_to_time(time:str) -> int:
     """convert the time in the period to seconds
@@ -15,7 +45,8 @@ def convert_to_time(time:str) -> int:
     Returns:
         int: the time in seconds
     """
-    return int(time.split(":")[0]) * 60 + int(time.split(":")[1])
+    minutes, seconds = time.split(":")
+    return int(minutes) * 60 + int(seconds)
 
 def sort_event_by_time(events:List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """sort the events by time
@@ -42,53 +73,266 @@ def extract_player_data(json_player_data:Dict[str, Any]) -> Dict[int, Player]:
         players_dict[player["playerId"]] = Player(player)
     return players_dict
         
-def import_game_stats(game_id:int) -> Tuple[List[ShotsEvent], Dict[int, Player]]:
+def import_game_stats(game_id:int, context : Optional[ProcessingContext] = None) -> Tuple[List[ShotsEvent], Dict[int, Player]]:
     """import the game stats from the json
 
     Args:
         game_id (int): the game id
+        context (Optional[ProcessingContext]): the registries to fill (defaults to the current context)
 
     Returns:
         Tuple[List[ShotsEvent], Dict[int, Player]]: the list of events and the dictionary of players
     """
-    game_data = get_data.retrieve_game_data(game_id, verbose=True)
+    context = current_context(context)
+    game_data = get_data.retrieve_game_data(game_id, verbose=True, fields=GAME_STATS_FIELDS)
     players_dict = extract_player_data(game_data["rosterSpots"])
     events = game_data["plays"]
     events = sort_event_by_time(events)
-    game : Game = Game.get_game(game_id)
+    game : Game = Game.get_game(game_id, play_by_play=game_data, context=context)
     print("printing game :", game)
+    context.reset_shots(game_id)
     for event in events:
         try:
             if event["typeDescKey"] == "goal":
-                Goal(game, event)
+                Goal(game, event, context=context)
             elif event["typeDescKey"] == "shot-on-goal":
-                ShotOnGoal(game, event)
+                ShotOnGoal(game, event, context=context)
             else:
-                Event(game, event, prev_event=True)
+                Event(game, event, prev_event=True, context=context)
         except KeyError:
             continue
-    return ShotsEvent.get_shots_by_game(game_id), players_dict
+    return ShotsEvent.get_shots_by_game(game_id, context=context), players_dict
 
-def game_stats_to_table(game_id : int, df : List[Dict[str, Any]] = []) -> List[Dict[str, Any]]:
+def game_stats_to_table(game_id : int, df : Optional[List[Dict[str, Any]]] = None, context : Optional[ProcessingContext] = None) -> List[Dict[str, Any]]:
 
-    event_list, players_dict = import_game_stats(game_id)
-    game: Game = Game.get_game(game_id)
+    if df is None:
+        df = []
+    context = current_context(context)
+    event_list, players_dict = import_game_stats(game_id, context=context)
+    game: Game = Game.get_game(game_id, context=context)
     game_dict = game.to_dict()
     for event in event_list:
         event_json = event.to_dict()
         event_json.update(game_dict)
         event_json['type'] = event.get_event_type()
         df.append(event_json)
+    context.emitted(game_id)
     return df
 
-def games_to_table(game_ids : Iterable) -> pd.DataFrame:
-    df = []
+def expand_game_ids(game_ids : Iterable) -> Iterator[int]:
+    """expand seasons (4 digits ids) into their regular season games
+
+    Args:
+        game_ids (Iterable): game ids and/or seasons
+
+    Yields:
+        int: the game ids
+    """
     for game_id in game_ids:
         if len(str(game_id)) == 4:
-            games = get_data.regular_season_game_id_generator(game_id)
-            for game in games:
+            for game in get_data.regular_season_game_id_generator(game_id):
                 print("game", game)
-                df = game_stats_to_table(game, df)
+                yield game
         else:
-            df = game_stats_to_table(game_id, df)
+            yield game_id
+
+def games_to_table(game_ids : Iterable, context : Optional[ProcessingContext] = None) -> pd.DataFrame:
+    df = []
+    for game_id in expand_game_ids(game_ids):
+        df = game_stats_to_table(game_id, df, context=context)
     return pd.DataFrame(df)
+
+def object_array(values : List[Any]) -> np.ndarray:
+    """make a 1d object array without numpy looking into the values"""
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+def plays_to_columns(plays : List[Dict[str, Any]], game : Game, context : Optional[ProcessingContext] = None) -> Dict[str, List[Any]]:
+    """turn the events of a game straight into the columns of its shot rows, without event objects
+
+    The rows, columns and column order are the ones `game_stats_to_table` produces. The previous event
+    columns are the last non-shot event before each shot, taken from the event columns with a forward
+    filled index (the last event of the game processed before in the context if a shot comes first).
+
+    Args:
+        plays (List[Dict[str, Any]]): the events of the play by play json
+        game (Game): the game
+        context (Optional[ProcessingContext]): holds the previous event across games (defaults to the current context)
+
+    Returns:
+        Dict[str, List[Any]]: column name -> values of the shots (empty if the game has no shot)
+    """
+    context = current_context(context)
+    plays = [event for event in plays if "typeDescKey" in event]
+    if not plays:
+        return {}
+    periods = np.array([event["periodDescriptor"]["number"] for event in plays])
+    seconds = np.array([convert_to_time(event["timeInPeriod"]) for event in plays])
+    plays = [plays[i] for i in np.lexsort((seconds, periods))]  # stable, like sort_event_by_time
+
+    types = object_array([event["typeDescKey"] for event in plays])
+    goals = types == "goal"
+    shots_on_goal = types == "shot-on-goal"
+    is_shot = goals | shots_on_goal
+    # index of the last non-shot event up to each event, -1 before the first one
+    last_event = np.maximum.accumulate(np.where(is_shot, -1, np.arange(len(plays))))
+    shots = np.flatnonzero(is_shot)
+    previous = context.previous_event.to_dict() if context.previous_event is not None else {}
+    if last_event[-1] >= 0:
+        Event(game, plays[last_event[-1]], prev_event=True, context=context)  # carried over to the next game
+    if not len(shots):
+        return {}
+    prev = last_event[shots]
+    shot_plays = [plays[i] for i in shots]
+    # the previous events, plus the one of the context picked by the -1 indices
+    prev_events = Event.extractor.extract_columns([plays[i] for i in prev[prev >= 0]])
+    prev_index = np.cumsum(prev >= 0) - 1
+    prev_index[prev < 0] = -1
+
+    columns = {"game": [game] * len(shots)}
+    columns.update(Event.extractor.extract_columns(shot_plays))
+    columns["prev_game"] = object_array([game, previous.get("prev_game")])[np.where(prev >= 0, 0, 1)].tolist()
+    for name, prev_name in zip(Event.extractor.names, Event.prev_extractor.names):
+        columns[prev_name] = object_array(prev_events[name] + [previous.get(prev_name)])[prev_index].tolist()
+    columns.update(ShotsEvent.extractor.extract_columns(shot_plays))
+
+    # type specific columns are missing (NaN) on the rows of the other type, and appear when the type first does
+    by_type = [(goals[shots], Goal), (shots_on_goal[shots], ShotOnGoal)]
+    by_type.sort(key=lambda mask_and_class: np.argmax(mask_and_class[0]) if mask_and_class[0].any() else len(shots))
+    for i, (mask, event_class) in enumerate(by_type):
+        if i == 1:
+            for key, value in game.to_dict().items():
+                columns[key] = [value] * len(shots)
+            columns["type"] = types[shots].tolist()
+        if not mask.any():
+            continue
+        for name, values in event_class.extractor.extract_columns(shot_plays).items():
+            if name not in columns:
+                has_name = np.logical_or.reduce([m for m, c in by_type if name in c.extractor.names])
+                columns[name] = np.where(has_name, object_array(values), np.nan).tolist()
+    return columns
+
+def game_stats_to_columns(game_id : int, context : Optional[ProcessingContext] = None) -> Dict[str, List[Any]]:
+    """columnar counterpart of `game_stats_to_table`: the shot rows of a game as columns
+
+    Args:
+        game_id (int): the game id
+        context (Optional[ProcessingContext]): the registries to use (defaults to the current context)
+
+    Returns:
+        Dict[str, List[Any]]: column name -> values of the shots
+    """
+    context = current_context(context)
+    game_data = get_data.retrieve_game_data(game_id, verbose=True, fields=PLAYS_FIELDS)
+    game : Game = Game.get_game(game_id, play_by_play=game_data, context=context)
+    columns = plays_to_columns(game_data["plays"], game, context=context)
+    context.emitted(game_id)
+    return columns
+
+def games_to_table_columnar(game_ids : Iterable, context : Optional[ProcessingContext] = None) -> pd.DataFrame:
+    """fast path of `games_to_table` building the same table from columns instead of event objects
+
+    The shots are not registered in the context (see `import_game_stats` for that).
+
+    Args:
+        game_ids (Iterable): game ids and/or seasons
+        context (Optional[ProcessingContext]): the registries to use (defaults to the current context)
+
+    Returns:
+        pd.DataFrame: the shots table
+    """
+    table : Dict[str, List[Any]] = {}
+    n_rows = 0
+    for game_id in expand_game_ids(game_ids):
+        n_rows = append_columns(table, n_rows, game_stats_to_columns(game_id, context=context))
+    return pd.DataFrame(table)
+
+def append_columns(table : Dict[str, List[Any]], n_rows : int, columns : Dict[str, List[Any]]) -> int:
+    """append the columns of a game to a table, like appending its rows to a list of records
+
+    Args:
+        table (Dict[str, List[Any]]): the table columns (modified in place)
+        n_rows (int): the number of rows of the table
+        columns (Dict[str, List[Any]]): the columns of the game (from `game_stats_to_columns`)
+
+    Returns:
+        int: the new number of rows
+    """
+    n = len(columns["eventId"]) if columns else 0
+    for name, values in table.items():
+        if name not in columns:  # missing keys are NaN in a frame made of records
+            values.extend([np.nan] * n)
+    for name, values in columns.items():
+        if name not in table:
+            table[name] = [np.nan] * n_rows
+        table[name].extend(values)
+    return n_rows + n
+
+def games_to_table_chunks(game_ids : Iterable, games_per_chunk : int = 1, columnar : bool = True, context : Optional[ProcessingContext] = None) -> Iterator[pd.DataFrame]:
+    """build the shots table a few games at a time, so only one chunk is held in memory
+
+    Concatenating the chunks gives the rows of `games_to_table` (the columns of a chunk are the ones
+    its games have, see `write_table_chunks` to give them all the same schema).
+
+    Args:
+        game_ids (Iterable): game ids and/or seasons
+        games_per_chunk (int): number of games in each chunk
+        columnar (bool): use the columnar fast path (`game_stats_to_columns`) instead of event objects
+        context (Optional[ProcessingContext]): the registries to use (defaults to a context releasing each game once processed)
+
+    Yields:
+        pd.DataFrame: the shots of the next `games_per_chunk` games
+    """
+    if games_per_chunk < 1:
+        raise ValueError(f"games_per_chunk must be at least 1. Got {games_per_chunk}")
+    if context is None:
+        context = ProcessingContext(release_after_emit=True)
+    chunk : Any = {} if columnar else []
+    n_rows = n_games = 0
+    for game_id in expand_game_ids(game_ids):
+        if columnar:
+            n_rows = append_columns(chunk, n_rows, game_stats_to_columns(game_id, context=context))
+        else:
+            chunk = game_stats_to_table(game_id, chunk, context=context)
+        n_games += 1
+        if n_games == games_per_chunk:
+            yield pd.DataFrame(chunk)
+            chunk = {} if columnar else []
+            n_rows = n_games = 0
+    if n_games:
+        yield pd.DataFrame(chunk)
+
+def write_table_chunks(chunks : Iterable[pd.DataFrame], directory : str, format : str = "parquet") -> List[str]:
+    """sink writing the chunks of the shots table as they come, partitioned by season
+
+    Each chunk goes to `<directory>/season=<season>/part-<chunk number>.<format>`. The game objects are
+    dropped and the columns get the types of `TABLE_DTYPES`, so every part has the same schema and
+    `pd.read_parquet(directory)` reads the whole table back (the season then comes from the directory
+    names). Use a new directory: the parts of a previous run are not removed.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): the chunks (see `games_to_table_chunks`)
+        directory (str): the root of the partitioned table
+        format (str): "parquet" (needs pyarrow or fastparquet) or "csv" (the csv parts keep the season column)
+
+    Returns:
+        List[str]: the written files
+    """
+    if format not in ("parquet", "csv"):
+        raise ValueError(f"format must be parquet or csv. Got {format}")
+    paths = []
+    for i, chunk in enumerate(chunks):
+        if chunk.empty:
+            continue
+        chunk = chunk.reindex(columns=list(TABLE_DTYPES)).astype(TABLE_DTYPES)
+        for season, part in chunk.groupby("season", sort=False):
+            part_dir = os.path.join(directory, f"season={season}")
+            os.makedirs(part_dir, exist_ok=True)
+            path = os.path.join(part_dir, f"part-{i:05d}.{format}")
+            if format == "parquet":
+                part.drop(columns="season").to_parquet(path, index=False)
+            else:
+                part.to_csv(path, index=False)
+            paths.append(path)
+    return paths
@@ -1,12 +1,79 @@
+import io
+import os
 import math
+import pickle
+import tempfile
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
 from .preprocess import import_game_stats
-from ift6758.data.get_data import regular_season_game_id_generator, retrieve_game_data
+import multiprocessing
+from ift6758.data.get_data import regular_season_game_id_generator, retrieve_game_data, get_raw_store, set_raw_store
+from ift6758.data.raw_store import RawStore
 from .trigonometry import determine_enemy_net_coords, compute_angle_from_net, compute_distance_from_net
 from .event_types import ShotsEvent
 from .game import Game
-from typing import List, Dict, Any, Tuple , Optional
+from .context import ProcessingContext, current_context
+from .feature_cache import FeatureCache
+from typing import List, Dict, Any, Tuple , Optional, NamedTuple
+import numpy as np
 import pandas as pd
 
+# compact types of the columns of the games dataframe (see `apply_schema`)
+FRAME_DTYPES : Dict[str, str] = {
+    "game_id": "int32",
+    "season": "int32",
+    "home_team_id": "int16",
+    "away_team_id": "int16",
+    "event_id": "int32",
+    "owner_team_id": "int16",
+    "event_type": "category",
+    "situation_code": "category",
+    "shot_type": "category",
+    "time_period": "int16",
+    "period_number": "int8",
+    "zone_code": "category",
+    "x_coord": "int16",
+    "y_coord": "int16",
+    "last_event_type": "category",
+    "last_event_xCoord": "float32",
+    "last_event_yCoord": "float32",
+    "time_passed_since_last_event": "int32",
+    "distance_from_last_event": "float32",
+    "distance_from_net": "float32",
+    "angle_from_net": "float32",
+    "speed": "float32",
+    "change_in_shot_angle": "float32",
+    "home_team_side": "category",
+}
+
+
+def apply_schema(frame : pd.DataFrame, dtypes : Dict[str, str] = FRAME_DTYPES) -> pd.DataFrame:
+    """cast the columns of a frame to compact types
+
+    An integer column with missing values gets the nullable type of the same width ("int16" -> "Int16"),
+    and an integer column whose values do not fit in the type keeps its type. The other columns are left as is.
+
+    Args:
+        frame (pd.DataFrame): the frame
+        dtypes (Dict[str, str]): column -> type
+
+    Returns:
+        pd.DataFrame: the frame with the compact types
+    """
+    casts = {}
+    for column, dtype in dtypes.items():
+        if column not in frame.columns or frame[column].dtype == dtype:
+            continue
+        if dtype.startswith("int"):
+            values = pd.to_numeric(frame[column], errors="coerce")
+            if values.notna().any() and not (np.iinfo(dtype).min <= values.min() and values.max() <= np.iinfo(dtype).max):
+                continue
+            if values.isna().any():
+                dtype = dtype.capitalize()
+        casts[column] = dtype
+    return frame.astype(casts) if casts else frame
+
 
 class Row:
     """ class to represent a row of the dataframe for the advanced features of the shots
@@ -18,7 +85,7 @@ class Row:
     LEFT_NET = (-89, 0)
     RIGHT_NET = (89, 0)
     
-    def __init__(self, shot : ShotsEvent, game : Game):
+    def __init__(self, shot : ShotsEvent, game : Game, compute : bool = True):
         self.game_id = game.get_id()
         self.season = game.get_season()
         self.home_team_id = game.get_home_data()[0]
@@ -39,7 +106,7 @@ class Row:
         prev_time = int(prev_time.split(":")[0]) * 60 + int(prev_time.split(":")[1])
         self.time_passed_since_last_event = self.time_period - prev_time
         self.distance_from_last_event = None
-        if not (self.last_event_xCoord is None or self.last_event_yCoord is None):
+        if compute and not (self.last_event_xCoord is None or self.last_event_yCoord is None):
             self.distance_from_last_event = self.compute_distance_from_last_event()
         self.rebound = False
         if self.last_event_type == 'shot-on-goal' or self.last_event_type == 'blocked-shot' or self.last_event_type == 'missed-shot':
@@ -48,13 +115,14 @@ class Row:
         self.angle_from_net = None
         self.speed = None
         self.change_in_shot_angle = None
-        self.set_home_team_side(shot.approximate_homeTeamSide(game))
+        self.set_home_team_side(shot.approximate_homeTeamSide(game), compute=compute)
             
-    def set_home_team_side(self, side : str):
+    def set_home_team_side(self, side : str, compute : bool = True):
         """set the home team side
 
         Args:
             side (str): the side of the home team
+            compute (bool): compute the features depending on the side (False when `compute_shot_geometry` does it in bulk)
         """
         if side not in ['left', 'right', 'central']:
             raise ValueError(f"The side must be either left, right or central. Got {side}")
@@ -62,12 +130,24 @@ class Row:
             self.home_team_side = side
             return
         self.home_team_side = side
+        if not compute:
+            return
         self.compute_distance_from_net()
         self.compute_angle_from_net()
         self.compute_angle_from_last_event()
         self.compute_change_in_shot_angle()
         self.compute_speed()
         
+    def compute_features(self, side : str):
+        """set the home team side and compute every feature depending on the geometry, once
+
+        Args:
+            side (str): the side of the home team
+        """
+        if not (self.last_event_xCoord is None or self.last_event_yCoord is None):
+            self.distance_from_last_event = self.compute_distance_from_last_event()
+        self.set_home_team_side(side)
+
     def compute_distance_from_last_event(self) -> float:
         """compute the distance from the last event
 
@@ -82,11 +162,21 @@ class Row:
         self.distance_from_last_event = distance
         return distance
     
+    def check_previous_event_coords(self):
+        """check that the previous event has coordinates, needed by the angles of a rebound
+
+        Raises:
+            ValueError: if the previous event has no coordinates
+        """
+        if self.last_event_xCoord is None or self.last_event_yCoord is None:
+            raise ValueError(f"The rebound {self.event_id} of game {self.game_id} has no previous event coordinates")
+
     def compute_angle_from_last_event(self) -> Optional[float]:
         """compute the angle from the last event
 
         Raises:
-            ValueError: if the home team side is not determined before computing the distance from the net or other related metrics
+            ValueError: if the home team side is not determined before computing the distance from the net or other related metrics,
+                or if the shot is a rebound without previous event coordinates
 
         Returns:
             Optional[float]: the angle from the last event
@@ -98,6 +188,7 @@ class Row:
             raise ValueError("The home team side has not been determined")
         elif self.home_team_side == 'left':
             net_x, net_y = Row.LEFT_NET
+        self.check_previous_event_coords()
         net_prev = (self.last_event_xCoord - net_x, self.last_event_yCoord - net_y)
         net_current = (self.x_coord - net_x, self.y_coord - net_y)
         dot_product = net_prev[0] * net_current[0] + net_prev[1] * net_current[1]
@@ -161,11 +252,15 @@ class Row:
     def compute_change_in_shot_angle(self) -> float:
         """compute the change in shot angle
 
+        Raises:
+            ValueError: if the shot is a rebound without previous event coordinates
+
         Returns:
             float: the change in shot angle
         """
         if self.flagged or not self.rebound:
             return None
+        self.check_previous_event_coords()
         net_x, net_y = Row.RIGHT_NET if self.home_team_side == 'left' else Row.LEFT_NET
         net_prev = (self.last_event_xCoord - net_x, self.last_event_yCoord - net_y)
         net_current = (self.x_coord - net_x, self.y_coord - net_y)
@@ -193,81 +288,478 @@ class Row:
         return speed
         
         
+def resolve_home_team_sides(game_ids : np.ndarray, periods : np.ndarray, votes : np.ndarray) -> np.ndarray:
+    """determine the side of the home team of every shot from the votes of the shots (`approximate_homeTeamSide`)
+
+    A shot with a vote ('left' or 'right') keeps it. A 'central' shot takes the last vote before it in
+    its (game, period), or the last vote of the period if none came before. In a period without any
+    vote, the home team is on the left if it was on the right at the end of the previous period of the
+    game, else on the right. All the (game, period) groups are resolved at once, in one grouped pass.
+
+    Args:
+        game_ids (np.ndarray): game of the shots
+        periods (np.ndarray): period of the shots
+        votes (np.ndarray): 'left', 'right' or 'central' for each shot, in the order of the events
+
+    Returns:
+        np.ndarray: the side ('left' or 'right') of the home team for each shot
+    """
+    votes = np.asarray(votes, dtype=object)
+    if not len(votes):
+        return votes.copy()
+    keys = np.asarray(game_ids, dtype=np.int64) * 1000 + np.asarray(periods, dtype=np.int64)
+    groups, group_of = np.unique(keys, return_inverse=True)
+    order = np.argsort(group_of, kind="stable")  # the events of each group together, in their order
+    group_of, sorted_votes = group_of[order], votes[order]
+    starts = np.searchsorted(group_of, np.arange(len(groups)))
+    positions = np.arange(len(sorted_votes))
+    voted = np.where(sorted_votes != 'central', positions, -1)
+
+    last_vote = np.maximum.accumulate(voted)  # last vote so far, maybe of a previous group
+    last_vote = np.where(last_vote >= starts[group_of], last_vote, -1)
+    period_vote = np.maximum.reduceat(voted, starts)  # last vote of each group
+    resolved = np.where(last_vote >= 0, last_vote, period_vote[group_of])
+    sides = np.where(resolved >= 0, sorted_votes[resolved], None)
+
+    if (resolved < 0).any():  # periods without a vote: the opposite of the end of the previous period
+        previous = np.searchsorted(groups, groups - 1)
+        found = (previous < len(groups)) & (groups[np.minimum(previous, len(groups) - 1)] == groups - 1)
+        previous_vote = np.where(found, period_vote[np.minimum(previous, len(groups) - 1)], -1)
+        previous_side = np.where(previous_vote >= 0, sorted_votes[np.maximum(previous_vote, 0)], None)
+        fallback = np.where(previous_side == 'right', 'left', 'right').astype(object)
+        sides = np.where(resolved >= 0, sides, fallback[group_of])
+
+    result = np.empty(len(votes), dtype=object)
+    result[order] = sides
+    return result
+
+
+def compute_shot_geometry(
+    x_coord : np.ndarray,
+    y_coord : np.ndarray,
+    last_event_xCoord : np.ndarray,
+    last_event_yCoord : np.ndarray,
+    owner_team_id : np.ndarray,
+    home_team_id : np.ndarray,
+    home_team_side : np.ndarray,
+    rebound : np.ndarray,
+    time_passed_since_last_event : np.ndarray,
+    game_id : Optional[np.ndarray] = None,
+    event_id : Optional[np.ndarray] = None,
+) -> Dict[str, np.ndarray]:
+    """compute the geometry features of `Row` for many shots at once (a game or a whole season)
+
+    The semantics are the ones of the per-row methods: flagged shots (no coordinates) get no feature,
+    the angles are only for rebounds, the speed is missing when no time passed since the last event,
+    and the net is picked from the home team side the same way. Missing features are NaN.
+
+    Args:
+        x_coord (np.ndarray): x of the shots (NaN if missing)
+        y_coord (np.ndarray): y of the shots (NaN if missing)
+        last_event_xCoord (np.ndarray): x of the previous events (NaN if missing)
+        last_event_yCoord (np.ndarray): y of the previous events (NaN if missing)
+        owner_team_id (np.ndarray): team of the shooters
+        home_team_id (np.ndarray): home teams
+        home_team_side (np.ndarray): side of the home teams ('left' or 'right')
+        rebound (np.ndarray): True for the rebounds
+        time_passed_since_last_event (np.ndarray): seconds since the previous events
+        game_id (Optional[np.ndarray]): game of the shots (only to name a shot in the errors)
+        event_id (Optional[np.ndarray]): event id of the shots (only to name a shot in the errors)
+
+    Raises:
+        ValueError: if a home team side is not determined, or if a rebound has no previous event coordinates (like the per-row path)
+        ZeroDivisionError: if a rebound or its previous event is on the net (like `Row.compute_change_in_shot_angle`)
+
+    Returns:
+        Dict[str, np.ndarray]: distance_from_last_event, distance_from_net, angle_from_net, speed and change_in_shot_angle
+    """
+    x, y = np.asarray(x_coord, dtype=float), np.asarray(y_coord, dtype=float)
+    last_x, last_y = np.asarray(last_event_xCoord, dtype=float), np.asarray(last_event_yCoord, dtype=float)
+    time_passed = np.asarray(time_passed_since_last_event, dtype=float)
+    side_left = np.asarray(home_team_side) == 'left'
+    if not (side_left | (np.asarray(home_team_side) == 'right')).all():
+        raise ValueError("The home team side has not been determined")
+    rebound = np.asarray(rebound, dtype=bool)
+    flagged = np.isnan(x) | np.isnan(y)
+    no_last_event = np.isnan(last_x) | np.isnan(last_y)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        distance_from_last_event = np.where(flagged | no_last_event, np.nan, ((x - last_x)**2 + (y - last_y)**2)**0.5)
+
+        # the shooting team attacks the right net when exactly one of "home team" and "home team on the left" holds
+        owner_is_home = np.asarray(owner_team_id) == np.asarray(home_team_id)
+        net_x = np.where((owner_is_home.astype(int) + side_left) % 2 == 0, Row.RIGHT_NET[0], Row.LEFT_NET[0])
+        net_y = Row.RIGHT_NET[1]
+        distance_from_net = np.where(flagged, np.nan, ((x - net_x)**2 + (y - net_y)**2)**0.5)
+
+        # the angles use the net on the side opposite to the home team, whoever shoots
+        net_x = np.where(side_left, Row.RIGHT_NET[0], Row.LEFT_NET[0])
+        angle_from_net = np.where(flagged, np.nan, np.degrees(np.arctan2(np.abs(net_y - y), np.abs(net_x - x))))
+
+        angled = rebound & ~flagged
+        if (angled & no_last_event).any():
+            shot = np.flatnonzero(angled & no_last_event)[0]
+            game = "?" if game_id is None else np.asarray(game_id)[shot]
+            event = "?" if event_id is None else np.asarray(event_id)[shot]
+            raise ValueError(f"The rebound {event} of game {game} has no previous event coordinates")
+        prev_x, prev_y = last_x - net_x, last_y - net_y
+        current_x, current_y = x - net_x, y - net_y
+        magnitude_prev = (prev_x**2 + prev_y**2)**0.5
+        magnitude_current = (current_x**2 + current_y**2)**0.5
+        if (angled & ((magnitude_prev == 0) | (magnitude_current == 0))).any():
+            raise ZeroDivisionError("float division by zero")
+        cos_angle = np.clip((prev_x * current_x + prev_y * current_y) / (magnitude_prev * magnitude_current), -1, 1)
+        change_in_shot_angle = np.where(angled, np.degrees(np.arccos(cos_angle)), np.nan)
+
+        speed = np.where(flagged | (time_passed == 0), np.nan, distance_from_last_event / time_passed)
+    return {
+        "distance_from_last_event": distance_from_last_event,
+        "distance_from_net": distance_from_net,
+        "angle_from_net": angle_from_net,
+        "speed": speed,
+        "change_in_shot_angle": change_in_shot_angle,
+    }
+
+
+def init_build_worker(store : RawStore):
+    """initializer of the worker processes of `PreprocessII.build_games_parallel`
+
+    A worker started with "spawn" or "forkserver" (the default on macOS, Windows and from Python 3.14)
+    does not inherit the store set with `set_raw_store`, so the store of the parent is set explicitly.
+
+    Args:
+        store (RawStore): the raw store of the parent process
+    """
+    set_raw_store(store)
+
+
+def build_game_frame(game_id : int, feature_cache : Optional[FeatureCache] = None, bulk : bool = False) -> Tuple[int, Optional[pd.DataFrame], Optional[str]]:
+    """build the frame of a game in its own context (the task of the parallel mode of `PreprocessII.get_games_df`)
+
+    Args:
+        game_id (int): the game id
+        feature_cache (Optional[FeatureCache]): where to look for the frame before building it
+        bulk (bool): compute the geometry features of the game at once
+
+    Returns:
+        Tuple[int, Optional[pd.DataFrame], Optional[str]]: (game id, frame of the game or None, error or None)
+    """
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # the workers would interleave their logs
+            frame = PreprocessII.get_game_frame(game_id, ProcessingContext(release_after_emit=True), feature_cache, bulk)
+        return game_id, frame, None
+    except Exception as e:
+        return game_id, None, f"{type(e).__name__}: {e}"
+
+
+class BuildResult(NamedTuple):
+    """result of `PreprocessII.build_games_parallel`"""
+    frames : Dict[int, pd.DataFrame]  # game id -> frame, of the games built
+    failures : Dict[int, str]  # game id -> error, of the games left out
+
+
+class BuildCheckpoint:
+    """frames of the games already built, flushed to a directory so an interrupted build can resume
+
+    Every `every` games, the new frames are written as one part (`part-<n>.pkl`, a pickled dict
+    game id -> frame). Opening a directory with parts loads them, and their games are not built again.
+
+    Args:
+        directory (str): the directory of the parts (created if needed)
+        every (int): number of games between two flushes
+    """
+
+    def __init__(self, directory : str, every : int = 50):
+        if every < 1:
+            raise ValueError(f"every must be at least 1. Got {every}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.every = every
+        self.frames : Dict[int, pd.DataFrame] = {}
+        self.pending : Dict[int, pd.DataFrame] = {}
+        self.parts = sorted(name for name in os.listdir(directory) if name.startswith("part-") and name.endswith(".pkl"))
+        for part in self.parts:
+            with open(os.path.join(directory, part), "rb") as file:
+                self.frames.update(pickle.load(file))
+
+    def __contains__(self, game_id : int) -> bool:
+        return game_id in self.frames or game_id in self.pending
+
+    def add(self, game_id : int, frame : pd.DataFrame):
+        """record the frame of a built game (flushing the new frames every `every` games)
+
+        Args:
+            game_id (int): the game id
+            frame (pd.DataFrame): the frame of the game
+        """
+        self.pending[game_id] = frame
+        if len(self.pending) >= self.every:
+            self.flush()
+
+    def flush(self):
+        """write the frames recorded since the last flush as a new part"""
+        if not self.pending:
+            return
+        name = f"part-{len(self.parts):05d}.pkl"
+        # write a temporary file and rename it so a part is either complete or absent
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                pickle.dump(self.pending, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, os.path.join(self.directory, name))
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp_path)
+            raise
+        self.parts.append(name)
+        self.frames.update(self.pending)
+        self.pending = {}
+
+
 class PreprocessII:
     
     games_df : pd.DataFrame = pd.DataFrame()
+    games_frames : List[pd.DataFrame] = []  # frames added since games_df was last materialized
     
-    def __init__(self, game_id : int):
-        not_processed : Dict[int, List[ShotsEvent]] = {}
-        period_homeSide : Dict[int, str] = {}
-        event_list, players_info = import_game_stats(game_id)
-        game = Game.get_game(game_id)
-        self.game_data = []
-        for event in event_list:
-            row : Row = Row(event, game)
-            if row.home_team_side == 'central':
-                if period_homeSide.get(row.period_number) is None:
-                    try:
-                        not_processed[row.period_number].append(row)
-                    except KeyError:
-                        not_processed[row.period_number] = [row]
-                else:
-                    row.set_home_team_side(period_homeSide[row.period_number])
+    def __init__(self, game_id : int, context : Optional[ProcessingContext] = None, bulk : bool = False):
+        context = current_context(context)
+        self.bulk = bulk
+        event_list, players_info = import_game_stats(game_id, context=context)
+        game = Game.get_game(game_id, context=context)
+        # the rows only vote for the home team side, the features are computed once the side is resolved
+        self.game_data = [Row(event, game, compute=False) for event in event_list]
+        sides = resolve_home_team_sides(
+            np.full(len(self.game_data), game_id),
+            np.array([row.period_number for row in self.game_data]),
+            np.array([row.home_team_side for row in self.game_data], dtype=object),
+        )
+        for row, side in zip(self.game_data, sides):
+            if bulk:
+                row.set_home_team_side(side, compute=False)
             else:
-                period_homeSide[row.period_number] = row.home_team_side
-            self.game_data.append(row)
-        for period, row_list in not_processed.items():
-            home_side = period_homeSide.get(period, "central")
-            if home_side == "central":
-                home_side = "left" if period_homeSide.get(period-1) == "right" else "right"
-            for row in row_list:
-                row.set_home_team_side(home_side)
+                row.compute_features(side)
+        if bulk:
+            self.compute_geometry()
+        context.emitted(game_id)
+
+    def compute_geometry(self):
+        """compute the geometry features of all the rows at once with `compute_shot_geometry`"""
+        if not self.game_data:
+            return
+        columns = ["x_coord", "y_coord", "last_event_xCoord", "last_event_yCoord"]
+        arrays = [np.array([getattr(row, name) for row in self.game_data], dtype=float) for name in columns]  # None -> NaN
+        columns = ["owner_team_id", "home_team_id", "home_team_side", "rebound", "time_passed_since_last_event", "game_id", "event_id"]
+        arrays += [np.array([getattr(row, name) for row in self.game_data]) for name in columns]
+        geometry = compute_shot_geometry(*arrays)
+        for name, values in geometry.items():
+            for row, value in zip(self.game_data, np.where(np.isnan(values), None, values).tolist()):
+                setattr(row, name, value)
         
-    def to_dataframe(self) -> pd.DataFrame:
-        """convert the data to a dataframe
+    def game_frame(self) -> pd.DataFrame:
+        """convert the rows of the game to a dataframe
 
         Returns:
-            pd.DataFrame: the dataframe
+            pd.DataFrame: the dataframe of the game
         """
         game_df = []
         for row in self.game_data:
             row_dict : Dict[str, Any] = row.__dict__
             game_df.append(row_dict)
         game_df = pd.DataFrame(game_df)
-        PreprocessII.games_df = pd.concat([PreprocessII.games_df, game_df], ignore_index=True)
         return game_df
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """convert the data to a dataframe
+
+        Returns:
+            pd.DataFrame: the dataframe
+        """
+        game_df = self.game_frame()
+        PreprocessII.games_frames.append(game_df)  # concatenated once, by collect_games_df
+        return game_df
+
+    @staticmethod
+    def get_game_frame(
+        game_id : int,
+        context : Optional[ProcessingContext] = None,
+        feature_cache : Optional[FeatureCache] = None,
+        bulk : bool = False,
+    ) -> pd.DataFrame:
+        """get the frame of a game, from the feature cache if it holds an up to date one
+
+        Args:
+            game_id (int): the game id
+            context (Optional[ProcessingContext]): the registries to use (defaults to the current context)
+            feature_cache (Optional[FeatureCache]): the cache of processed games (None to always build the game)
+            bulk (bool): compute the geometry features of all the shots at once (see `compute_shot_geometry`)
+
+        Returns:
+            pd.DataFrame: the frame of the game
+        """
+        if feature_cache is None:
+            return PreprocessII(game_id, context=context, bulk=bulk).game_frame()
+        return feature_cache.get_or_build(game_id, lambda id: PreprocessII(id, context=context, bulk=bulk).game_frame())
+
+    @staticmethod
+    def collect_games_df(compact : bool = False) -> pd.DataFrame:
+        """materialize the games dataframe with the frames added since the last call
+
+        Args:
+            compact (bool): cast the columns to the compact types of `FRAME_DTYPES` (see `apply_schema`)
+
+        Returns:
+            pd.DataFrame: the games dataframe
+        """
+        if PreprocessII.games_frames:
+            PreprocessII.games_df = pd.concat([PreprocessII.games_df] + PreprocessII.games_frames, ignore_index=True)
+            PreprocessII.games_frames = []
+        if compact:
+            PreprocessII.games_df = apply_schema(PreprocessII.games_df)  # once for all the games (categories differ between games)
+        return PreprocessII.games_df
     
     @staticmethod
     def clear_games_df():
         """clear the games dataframe
         """
         PreprocessII.games_df = pd.DataFrame()
+        PreprocessII.games_frames = []
     
     @staticmethod
-    def get_games_df(seasons : List[int], reset_df : bool = True) -> pd.DataFrame:
+    def get_games_df(
+        seasons : List[int],
+        reset_df : bool = True,
+        context : Optional[ProcessingContext] = None,
+        workers : int = 1,
+        checkpoint_dir : Optional[str] = None,
+        checkpoint_every : int = 50,
+        feature_cache : Optional[FeatureCache] = None,
+        bulk : bool = False,
+        compact : bool = False,
+    ) -> pd.DataFrame:
         """get the games dataframe
 
         Args:
             seasons (List[int]): the list of seasons
+            context (Optional[ProcessingContext]): the registries to use (defaults to a context releasing each game once processed)
+            workers (int): number of processes building the games in parallel (see `build_games_parallel`)
+            checkpoint_dir (Optional[str]): flush the built games to this directory, and skip the games already there (see `BuildCheckpoint`)
+            checkpoint_every (int): number of games between two flushes
+            feature_cache (Optional[FeatureCache]): reuse the frames of the games processed before (see `FeatureCache`)
+            bulk (bool): compute the geometry features of each game at once (see `compute_shot_geometry`)
+            compact (bool): cast the columns to the compact types of `FRAME_DTYPES` (see `apply_schema`)
 
         Returns:
             pd.DataFrame: the games dataframe
         """
         if reset_df:
             PreprocessII.clear_games_df()
-        for season in seasons:
-            games = regular_season_game_id_generator(season)
-            for id in games:
-                data = PreprocessII(id)
-                data.to_dataframe()
-        return PreprocessII.games_df
+        game_ids = [id for season in seasons for id in regular_season_game_id_generator(season)]
+        checkpoint = BuildCheckpoint(checkpoint_dir, checkpoint_every) if checkpoint_dir is not None else None
+        todo = [id for id in game_ids if checkpoint is None or id not in checkpoint]
+        try:
+            if workers > 1:
+                frames, failures = PreprocessII.build_games_parallel(todo, workers, checkpoint=checkpoint, feature_cache=feature_cache, bulk=bulk)
+                if failures:
+                    print(f"{len(failures)} game(s) left out: {sorted(failures)}")
+            else:
+                frames = {}
+                if context is None:
+                    context = ProcessingContext(release_after_emit=True)
+                for id in todo:
+                    frames[id] = PreprocessII.get_game_frame(id, context, feature_cache, bulk)
+                    if checkpoint is not None:
+                        checkpoint.add(id, frames[id])
+        finally:
+            if checkpoint is not None:
+                checkpoint.flush()
+        if checkpoint is not None:
+            frames.update(checkpoint.frames)
+        PreprocessII.games_frames += [frames[id] for id in game_ids if id in frames]
+        return PreprocessII.collect_games_df(compact)
+
+    @staticmethod
+    def build_games_parallel(
+        game_ids : List[int],
+        workers : int,
+        checkpoint : Optional[BuildCheckpoint] = None,
+        feature_cache : Optional[FeatureCache] = None,
+        bulk : bool = False,
+        mp_context : Optional[str] = None,
+    ) -> BuildResult:
+        """build the frames of games on a pool of processes
+
+        Each game is built in its own context, so the previous event of its first shot must be in the
+        game (real play by plays start with a period-start event). A game raising an error is left out
+        and returned in the failures of the result instead of stopping the build.
+
+        On KeyboardInterrupt, the queued games are cancelled without waiting for them and the games
+        already built are recorded in the checkpoint before the interruption is raised again.
+
+        Args:
+            game_ids (List[int]): the game ids
+            workers (int): number of processes
+            checkpoint (Optional[BuildCheckpoint]): where to record the games as they are built
+            feature_cache (Optional[FeatureCache]): the cache of processed games shared by the workers
+            bulk (bool): compute the geometry features of each game at once
+            mp_context (Optional[str]): start method of the workers ("fork", "spawn" or "forkserver", defaults to the platform's).
+                The workers use the raw store of the parent process whatever the start method
+
+        Returns:
+            BuildResult: the frames of the games built and the errors of the games left out
+        """
+        frames : Dict[int, pd.DataFrame] = {}
+        failures : Dict[int, str] = {}
+
+        def record(game_id, frame, error):
+            if error is not None:
+                failures[game_id] = error
+                progress.write(f"Failed to preprocess game {game_id}: {error}")
+            else:
+                frames[game_id] = frame
+                if checkpoint is not None:
+                    checkpoint.add(game_id, frame)
+            progress.update()
+            progress.set_postfix(failed=len(failures))
+
+        context = multiprocessing.get_context(mp_context)
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_build_worker, initargs=(get_raw_store(),))
+        futures = []
+        wait = True
+        with tqdm(total=len(game_ids), desc="games", unit="game") as progress:
+            try:
+                futures = [executor.submit(build_game_frame, game_id, feature_cache, bulk) for game_id in game_ids]
+                for future in as_completed(futures):
+                    record(*future.result())
+            except KeyboardInterrupt:
+                # do not wait for the queued games, but keep the ones already built so the checkpoint can be flushed
+                wait = False
+                for future in futures:
+                    if future.done() and not future.cancelled() and future.exception() is None:
+                        game_id, frame, error = future.result()
+                        if game_id not in frames and game_id not in failures:
+                            record(game_id, frame, error)
+                raise
+            finally:
+                executor.shutdown(wait=wait, cancel_futures=True)
+        return BuildResult(frames, failures)
 
     @staticmethod
-    def get_game_df(game_id, reset_df : bool = True) -> pd.DataFrame:
+    def get_game_df(
+        game_id,
+        reset_df : bool = True,
+        context : Optional[ProcessingContext] = None,
+        feature_cache : Optional[FeatureCache] = None,
+        bulk : bool = False,
+        compact : bool = False,
+    ) -> pd.DataFrame:
         """get the games dataframe
 
         Args:
             seasons (List[int]): the list of seasons
+            context (Optional[ProcessingContext]): the registries to use (defaults to the current context)
+            feature_cache (Optional[FeatureCache]): serve the game from this cache when it is up to date
+            bulk (bool): compute the geometry features of the game at once
+            compact (bool): cast the columns to the compact types of `FRAME_DTYPES` (see `apply_schema`)
 
         Returns:
             pd.DataFrame: the games dataframe
@@ -275,6 +767,5 @@ class PreprocessII:
         if reset_df:
             PreprocessII.clear_games_df()
             
-        data = PreprocessII(game_id)
-        data.to_dataframe()
-        return PreprocessII.games_df
\ No newline at end of file
+        PreprocessII.games_frames.append(PreprocessII.get_game_frame(game_id, context, feature_cache, bulk))
+        return PreprocessII.collect_games_df(compact)
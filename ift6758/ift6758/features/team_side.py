@@ -1,5 +1,7 @@
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
+from typing import Tuple
 
 def determine_home_team_defending_side_offensive_event(event_row):
     if event_row['zoneCode'] != 'O':
@@ -78,3 +80,62 @@ def update_home_team_defending_side(df, home_team_defending_side_dict):
         if key in home_team_defending_side_dict:
             df.at[index, 'homeTeamDefendingSide'] = home_team_defending_side_dict[key]
     return df
+
+
+def determine_home_team_defending_sides(df) -> np.ndarray:
+    """vectorized `determine_home_team_defending_side_offensive_event`/`..._defensive_event` for every row
+
+    Args:
+        df (pd.DataFrame): events with the columns zoneCode, eventOwnerTeamId, homeTeam_id and xCoord
+
+    Returns:
+        np.ndarray: the defending side of the home team ('left', 'right') or None if it can not be determined
+            (not an offensive or defensive zone event, or an event on the center line)
+    """
+    zone = df['zoneCode']
+    offensive = zone.eq('O').fillna(False).to_numpy(dtype=bool)
+    defensive = zone.eq('D').fillna(False).to_numpy(dtype=bool)
+    home = df['eventOwnerTeamId'].eq(df['homeTeam_id']).fillna(False).to_numpy(dtype=bool)
+    x_coord = pd.to_numeric(df['xCoord']).to_numpy(dtype=float, na_value=np.nan)
+    # in the offensive zone, the home team defends the left side when it shoots at x > 0
+    left = ((x_coord > 0) == home) == offensive
+    determined = (offensive | defensive) & ((x_coord > 0) | (x_coord < 0))
+    return np.where(determined, np.where(left, 'left', 'right').astype(object), None)
+
+
+def resolve_home_team_defending_sides(df) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """determine and set the home team defending side of every (game, period) in one vectorized pass
+
+    Bulk equivalent of calling `populate_home_team_defending_side` for every (game, period) of the
+    frame, then `update_home_team_defending_side`: the side comes from the first offensive zone event
+    of the period, or from its first defensive zone event if it has no offensive zone event.
+
+    Args:
+        df (pd.DataFrame): the events (modified in place)
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]: the updated frame, the (id, periodDescriptor_number)
+            whose side was not found and the ones whose side does not match the existing homeTeamDefendingSide
+    """
+    keys = ['id', 'periodDescriptor_number']
+    pairs = df[keys].drop_duplicates().reset_index(drop=True)
+    zone = df['zoneCode']
+    candidate = (zone.eq('O') | zone.eq('D')).fillna(False).to_numpy(dtype=bool) & df[keys].notna().all(axis=1).to_numpy()
+    events = df.loc[candidate, keys].reset_index(drop=True)
+    events['priority'] = np.where(zone[candidate].to_numpy() == 'O', 0, 1)
+    events['side'] = determine_home_team_defending_sides(df[candidate])
+    events['existing'] = df.loc[candidate, 'homeTeamDefendingSide'].to_numpy()
+    # the first offensive zone event of each period, else its first defensive zone event
+    first = events.sort_values('priority', kind='stable').drop_duplicates(keys)
+
+    pairs = pairs.merge(first[keys + ['side', 'existing']], on=keys, how='left', sort=False)
+    found = pairs['side'].notna()
+    mismatch = found & pairs['existing'].notna() & (pairs['existing'] != pairs['side'])
+    not_found = pairs.loc[~found, keys].reset_index(drop=True)
+    mismatches = pairs.loc[mismatch, keys].reset_index(drop=True)
+
+    sides = pairs[found].set_index(keys)['side']
+    values = sides.reindex(pd.MultiIndex.from_frame(df[keys])).to_numpy()
+    resolved = pd.notna(values)
+    df.loc[resolved, 'homeTeamDefendingSide'] = values[resolved]
+    return df, not_found, mismatches
@@ -1,5 +1,7 @@
 import matplotlib.pyplot as plt
 import math
+import numpy as np
+import pandas as pd
 
 left_net_coords = (-100+11, 0)
 right_net_coords = (100-11, 0)
@@ -13,6 +15,69 @@ def determine_enemy_net_coords(row):
         net_coords = left_net_coords if row['homeTeamDefendingSide'] == "left" else right_net_coords
     return net_coords
 
+def as_float_array(values) -> np.ndarray:
+    """convert a column (or a scalar) to a float array, missing values becoming NaN"""
+    if isinstance(values, (pd.Series, pd.Index, pd.api.extensions.ExtensionArray)):
+        return values.to_numpy(dtype=float, na_value=np.nan)
+    try:
+        return np.asarray(values, dtype=float)
+    except TypeError:  # pd.NA
+        values = np.asarray(values, dtype=object)
+        return np.where(pd.isna(values), np.nan, values).astype(float)
+
+def enemy_net_x(eventOwnerTeamId, homeTeam_id, homeTeamDefendingSide) -> np.ndarray:
+    """vectorized `determine_enemy_net_coords`: the x coordinate of the net the event owner shoots at
+
+    Args:
+        eventOwnerTeamId (array-like): the team owning the events
+        homeTeam_id (array-like): the home team of the events
+        homeTeamDefendingSide (array-like): the side defended by the home team ('left' or 'right')
+
+    Returns:
+        np.ndarray: the x coordinate of the enemy net (the y coordinate of both nets is 0)
+    """
+    is_event_owner_home_team = as_float_array(homeTeam_id) == as_float_array(eventOwnerTeamId)
+    if isinstance(homeTeamDefendingSide, (pd.Series, pd.Index, pd.api.extensions.ExtensionArray)):
+        homeTeamDefendingSide = homeTeamDefendingSide.to_numpy(dtype=object, na_value=None)
+    homeTeamDefendingSide = np.asarray(homeTeamDefendingSide, dtype=object)
+    home_defends_left = np.where(pd.isna(homeTeamDefendingSide), None, homeTeamDefendingSide) == "left"
+    # the home team shoots at the right net when it defends the left one, the away team at the other one
+    return np.where(is_event_owner_home_team == home_defends_left, right_net_coords[0], left_net_coords[0])
+
+def compute_distances_from_net(xCoord, yCoord, eventOwnerTeamId, homeTeam_id, homeTeamDefendingSide) -> np.ndarray:
+    """vectorized `compute_distance_from_net` over whole columns
+
+    Args:
+        xCoord (array-like): the x coordinates of the events
+        yCoord (array-like): the y coordinates of the events
+        eventOwnerTeamId (array-like): the team owning the events
+        homeTeam_id (array-like): the home team of the events
+        homeTeamDefendingSide (array-like): the side defended by the home team ('left' or 'right')
+
+    Returns:
+        np.ndarray: the distances from the enemy net (NaN where a coordinate is missing)
+    """
+    net_x = enemy_net_x(eventOwnerTeamId, homeTeam_id, homeTeamDefendingSide)
+    return np.sqrt((as_float_array(xCoord) - net_x)**2 + as_float_array(yCoord)**2)
+
+def compute_angles_from_net(xCoord, yCoord, eventOwnerTeamId, homeTeam_id, homeTeamDefendingSide) -> np.ndarray:
+    """vectorized `compute_angle_from_net` over whole columns
+
+    Args:
+        xCoord (array-like): the x coordinates of the events
+        yCoord (array-like): the y coordinates of the events
+        eventOwnerTeamId (array-like): the team owning the events
+        homeTeam_id (array-like): the home team of the events
+        homeTeamDefendingSide (array-like): the side defended by the home team ('left' or 'right')
+
+    Returns:
+        np.ndarray: the angles from the enemy net in degrees (NaN where a coordinate is missing)
+    """
+    net_x = enemy_net_x(eventOwnerTeamId, homeTeam_id, homeTeamDefendingSide)
+    dx = np.abs(net_x - as_float_array(xCoord))
+    dy = np.abs(right_net_coords[1] - as_float_array(yCoord))
+    return np.arctan2(dy, dx) * (180 / math.pi)  # as math.degrees
+
 def compute_distance_from_net(row):
     net_coords = determine_enemy_net_coords(row)
     distance = ((row['xCoord'] - net_coords[0])**2 + row['yCoord']**2)**0.5
@@ -30,7 +30,97 @@ def parse_json(json : Dict[str, Any], keys : List[str], verbose : bool = False)
         res["_".join(path)] = val
     return res
 
+class KeyExtractor:
+    """compiled equivalent of `parse_json` followed by `stripAttribute`/`addPrefix` for a fixed list of keys
+
+    The keys are split and the final attribute names are computed once (typically once per class),
+    so extracting the attributes of a json is a single pass producing the final names directly.
+    The names come out in the same order as the step by step renaming would leave them.
+
+    Args:
+        keys (List[str]): the keys to get the values from the json (if the key is nested, use '.' to separate the keys)
+        strip (Optional[str]): the part to strip from the attribute names (see `JsonToObject.stripAttribute`)
+        prefix (str): the prefix to add to the attribute names (see `JsonToObject.addPrefix`)
+    """
+
+    def __init__(self, keys : List[str], strip : Optional[str] = None, prefix : str = ""):
+        specs = [(tuple(key.split(".")), "_".join(key.split("."))) for key in keys]
+        if strip:  # renamed attributes are re-added after the ones that keep their name
+            kept = [(path, name) for path, name in specs if strip not in name]
+            renamed = [(path, name.replace(strip, "")) for path, name in specs if strip in name]
+            specs = kept + renamed
+        self.specs : List[Tuple[Tuple[str, ...], str]] = [(path, prefix + name) for path, name in specs]
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        """the final attribute names, in extraction order"""
+        return tuple(name for _, name in self.specs)
+
+    def extract(self, json : Dict[str, Any]) -> Dict[str, Any]:
+        """get the values of the keys in the json under their final attribute names
+
+        Args:
+            json (Dict[str, Any]): the original json
+
+        Returns:
+            Dict[str, Any]: final attribute name -> value (None if the key is missing)
+        """
+        res = {}
+        for path, name in self.specs:
+            val = json
+            for p in path:
+                try:
+                    val = val[p]
+                except KeyError:
+                    val = None
+                    break
+            res[name] = val
+        return res
+
+    def extract_columns(self, jsons : List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+        """get the values of the keys in many jsons, one column per final attribute name
+
+        Args:
+            jsons (List[Dict[str, Any]]): the original jsons
+
+        Returns:
+            Dict[str, List[Any]]: final attribute name -> values (None where the key is missing)
+        """
+        res = {}
+        for path, name in self.specs:
+            if len(path) == 1:
+                res[name] = [json.get(path[0]) for json in jsons]
+                continue
+            values = []
+            for json in jsons:
+                val = json
+                for p in path:
+                    try:
+                        val = val[p]
+                    except KeyError:
+                        val = None
+                        break
+                values.append(val)
+            res[name] = values
+        return res
+
+
 class JsonToObject:
+
+    __slots__ = ()  # subclasses get a __dict__ unless they declare __slots__ (see JsonRecord)
+
+    def extract(self, json : Dict[str, Any], extractor : KeyExtractor, verbose : bool = False):
+        """set the attributes of the object from the json with a compiled extractor
+
+        Args:
+            json (Dict[str, Any]): the json to get the values from
+            extractor (KeyExtractor): the compiled keys
+        """
+        values = extractor.extract(json)
+        if verbose:
+            for key, value in values.items():
+                print(f"setting {key} to {value}")
+        self.__dict__.update(values)
         
     def setattr(self, json : Dict[str, Any], keys : List[str], verbose : bool = False):
         """set the attributes of the object from the json
@@ -60,7 +150,7 @@ class JsonToObject:
         Args:
             name (str): the part to strip
         """
-        keys = list(self.__dict__.keys())
+        keys = list(self.to_dict().keys())  # the set attributes, in the __dict__ or the __slots__
         for key in keys:
             if name in key:
                 if verbose:
@@ -73,7 +163,7 @@ class JsonToObject:
         Args:
             prefix (str): the prefix to add
         """
-        keys = list(self.__dict__.keys())
+        keys = list(self.to_dict().keys())  # the set attributes, in the __dict__ or the __slots__
         for key in keys:
             if verbose:
                 print(f"adding {prefix} to {key} -> {prefix + key}")
@@ -85,4 +175,59 @@ class JsonToObject:
         Returns:
             Dict[str, Any]: the dictionary representation of the object
         """
-        return self.__dict__
\ No newline at end of file
+        return self.__dict__
+
+class JsonRecord(JsonToObject):
+    """compact `JsonToObject` keeping its attributes in `__slots__` instead of a per-instance `__dict__`
+
+    Subclasses list the names of their attributes in `__slots__` (usually from the `names` of their
+    extractors). `to_dict` returns the attributes that are set, in slot order (base classes first).
+    The renaming helpers (`renameAttribute`, `stripAttribute`, `addPrefix`) only rename to slot names,
+    another name raises AttributeError.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def fields(cls) -> Tuple[str, ...]:
+        """get the slot names of the class, base classes first
+
+        Returns:
+            Tuple[str, ...]: the attribute names
+        """
+        try:
+            return cls.__dict__["_fields"]
+        except KeyError:
+            fields = []
+            for klass in reversed(cls.__mro__):
+                for name in klass.__dict__.get("__slots__", ()):
+                    if name not in fields:
+                        fields.append(name)
+            cls._fields = tuple(fields)
+            return cls._fields
+
+    def extract(self, json : Dict[str, Any], extractor : KeyExtractor, verbose : bool = False):
+        """set the attributes of the object from the json with a compiled extractor
+
+        Args:
+            json (Dict[str, Any]): the json to get the values from
+            extractor (KeyExtractor): the compiled keys (their names must be slots of the class)
+        """
+        for key, value in extractor.extract(json).items():
+            if verbose:
+                print(f"setting {key} to {value}")
+            setattr(self, key, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """convert the object to a dictionary (a new one, unlike `JsonToObject.to_dict`)
+
+        Returns:
+            Dict[str, Any]: the dictionary representation of the object
+        """
+        res = {}
+        for name in self.fields():
+            try:
+                res[name] = getattr(self, name)
+            except AttributeError:  # slot never set
+                continue
+        return res
@@ -0,0 +1,105 @@
+import random
+from typing import Any, Dict, List, Optional
+import pytest
+from ift6758.data import get_data
+from ift6758.data.nhl_api_stub import NHLApiStub
+from ift6758.data.raw_store import JsonDirectoryStore
+
+EVENT_TYPES = ["faceoff", "hit", "shot-on-goal", "goal", "missed-shot", "blocked-shot", "stoppage", "takeaway", "giveaway", "penalty"]
+EVENT_WEIGHTS = [8, 10, 20, 3, 10, 10, 8, 4, 4, 2]
+SHOT_TYPES = ["wrist", "slap", "snap", "backhand", "tip-in", "deflected", "wrap-around", "poke", None]
+SITUATION_CODES = ["1551", "1451", "0651", "1560", "1541", "1331", "0551", "1550"]
+
+
+def play(event_id : int, period : int, time : str, type_desc_key : str, situation_code : str = "1551", **details) -> Dict[str, Any]:
+    """build an event of a play by play"""
+    return {
+        "eventId": event_id,
+        "timeInPeriod": time,
+        "periodDescriptor": {"number": period},
+        "typeDescKey": type_desc_key,
+        "situationCode": situation_code,
+        "details": details,
+    }
+
+
+def game_payload(game_id : int, plays : List[Dict[str, Any]], home : int = 1, away : int = 31) -> Dict[str, Any]:
+    """build a play by play json around some events"""
+    season = int(str(game_id)[:4])
+    return {
+        "id": game_id,
+        "season": season * 10000 + season + 1,
+        "gameDate": f"{season}-10-10",
+        "gameState": "OFF",
+        "homeTeam": {"id": home, "abbrev": f"H{home}", "score": 0},
+        "awayTeam": {"id": away, "abbrev": f"A{away}", "score": 0},
+        "plays": plays,
+        "rosterSpots": [
+            {"playerId": 8400000 + k, "teamId": home if k % 2 else away, "firstName": {"default": f"F{k}"},
+             "lastName": {"default": f"L{k}"}, "positionCode": "C"}
+            for k in range(1, 41)
+        ],
+    }
+
+
+def synthetic_game(game_id : int, seed : Optional[int] = None) -> Dict[str, Any]:
+    """build a random but consistent play by play (the teams switch sides every period)"""
+    r = random.Random(game_id if seed is None else seed)
+    home, away = r.randint(1, 30), r.randint(31, 60)
+    plays = []
+    event_id = 1
+    for period in range(1, r.choice([3, 3, 4]) + 1):
+        home_attacks_right = r.choice([True, False]) == (period % 2 == 1)
+        plays.append(play(event_id, period, "00:00", "period-start"))
+        event_id += 1
+        for t in sorted(r.randint(1, 1199) for _ in range(r.randint(20 if period <= 3 else 0, 40))):
+            type_desc_key = r.choices(EVENT_TYPES, EVENT_WEIGHTS)[0]
+            owner = r.choice([home, away])
+            details = {"eventOwnerTeamId": owner}
+            if type_desc_key == "stoppage":
+                details = {"reason": "icing"}
+            elif r.random() > 0.05 or type_desc_key in ("shot-on-goal", "goal", "missed-shot", "blocked-shot"):
+                x = r.randint(25, 99) * (1 if r.random() > 0.1 else -1)
+                details["xCoord"] = x if (owner == home) == home_attacks_right else -x
+                details["yCoord"] = r.randint(-42, 42)
+                details["zoneCode"] = "O" if x > 25 else ("D" if x < -25 else "N")
+            if type_desc_key in ("shot-on-goal", "goal", "missed-shot"):
+                shot_type = r.choice(SHOT_TYPES)
+                if shot_type:
+                    details["shotType"] = shot_type
+                details["goalieInNetId"] = 8000000 + owner
+                details["scoringPlayerId" if type_desc_key == "goal" else "shootingPlayerId"] = 8400000 + r.randint(1, 40)
+            plays.append(play(event_id, period, f"{t // 60:02d}:{t % 60:02d}", type_desc_key, r.choice(SITUATION_CODES), **details))
+            event_id += 1
+    return game_payload(game_id, plays, home, away)
+
+
+@pytest.fixture
+def raw_store(tmp_path):
+    """an empty raw store used by `retrieve_game_data` for the duration of a test"""
+    previous = get_data.raw_store
+    store = JsonDirectoryStore(tmp_path / "raw")
+    get_data.set_raw_store(store)
+    yield store
+    get_data.raw_store = previous
+
+
+@pytest.fixture
+def synthetic_games(raw_store) -> List[int]:
+    """ids of 8 synthetic games saved in the raw store"""
+    game_ids = [2016020001 + i for i in range(8)]
+    for game_id in game_ids:
+        raw_store.save(game_id, synthetic_game(game_id))
+    return game_ids
+
+
+@pytest.fixture
+def api_stub(tmp_path, monkeypatch):
+    """a local NHL API serving 4 synthetic games (ids 2017020001..2017020004), used by `retrieve_game_data`"""
+    served = JsonDirectoryStore(tmp_path / "api")
+    for game_id in range(2017020001, 2017020005):
+        served.save(game_id, synthetic_game(game_id))
+    server = NHLApiStub(served).start()
+    monkeypatch.setattr(get_data, "api_client", get_data.NHLApiClient(server.base_url))
+    yield server
+    server.stop()
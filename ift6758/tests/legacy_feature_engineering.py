@@ -0,0 +1,63 @@
+"""row by row versions of the vectorized `FeatureEngineeringII` steps, the reference of the tests and of `benchmark_feature_engineering`"""
+from typing import Any, Callable, Dict
+import pandas as pd
+from ift6758.features.feature_engineering_II import FeatureEngineeringII
+
+
+class LegacyFeatureEngineeringII(FeatureEngineeringII):
+    """`FeatureEngineeringII` with the row by row versions of the vectorized steps and the eager clean_df, as a reference"""
+
+    def numerise_column(self, column : str, key_val : Dict[Any, Any], one_hot : bool = False, prefix : str = None):
+        if one_hot:
+            key_val = { i : i for i in key_val.keys() }
+        values = self.df[column].astype(object)  # apply on a categorical (the compact types) returns a categorical
+        self.df[column] = values.apply(lambda x: key_val.get(x, key_val['other']))
+        if one_hot:
+            self.df = pd.get_dummies(self.df, columns=[column], prefix=prefix)
+
+    def align_coord(self):
+        shoots_right = lambda x: (x['owner_team_id'] == x['home_team_id'] and x['home_team_side'] == "left") or (x['owner_team_id'] != x['home_team_id'] and x['home_team_side'] == "right")
+        self.df['current_x'] = self.df.apply(lambda x: x['x_coord'] if shoots_right(x) else -x['x_coord'], axis=1)
+        self.df['current_y'] = self.df.apply(lambda x: x['y_coord'] if shoots_right(x) else -x['y_coord'], axis=1)
+        self.df['prev_x'] = self.df.apply(lambda x: x['last_event_xCoord'] if shoots_right(x) else -x['last_event_xCoord'], axis=1)
+        self.df['prev_y'] = self.df.apply(lambda x: x['last_event_yCoord'] if shoots_right(x) else -x['last_event_yCoord'], axis=1)
+        self.irrelevant_columns += ["x_coord", "y_coord", "last_event_xCoord", "last_event_yCoord","home_team_id", "owner_team_id"]
+
+    def extract_empty_net_feature(self, df):
+        def is_empty_net(row):
+            situation_code = str(row['situation_code']).zfill(4)
+            event_owner_team_id = row['owner_team_id']
+            away_goalie_on_ice = situation_code[0] == '1'
+            away_skaters = int(situation_code[1])
+            home_skaters = int(situation_code[2])
+            home_goalie_on_ice = situation_code[3] == '1'
+            if event_owner_team_id == row['away_team_id']:
+                return 1 if not home_goalie_on_ice else 0
+            elif event_owner_team_id == row['home_team_id']:
+                return 1 if not away_goalie_on_ice else 0
+            else:
+                return 0
+
+        df['empty_net'] = df.apply(is_empty_net, axis=1)
+        df['empty_net'] = df['empty_net'].fillna(0)
+        return df
+
+    def clean_df(self, remove_irrelevant=False, columns=None):
+        self.replace_na()
+        self.add_labels()
+        self.numerise_zoneCode(one_hot_encode=False)
+        self.numerise_shotType(one_hot_encode=True)
+        self.align_coord()
+        self.extract_empty_net_feature(self.df)
+        self.keep_columns(columns)
+        if remove_irrelevant:
+            self.remove_irrelevant_columns()
+
+
+STEPS : Dict[str, Callable[[FeatureEngineeringII], Any]] = {
+    "numerise_zoneCode": lambda fe: fe.numerise_zoneCode(one_hot_encode=False),
+    "numerise_shotType": lambda fe: fe.numerise_shotType(one_hot_encode=True),
+    "numerise_previous_event": lambda fe: fe.numerise_previous_event(one_hot_encode=False),
+    "align_coord": lambda fe: fe.align_coord(),
+    "extract_empty_net_feature": lambda fe: fe.extract_empty_net_feature(fe.df),
+}
@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+from ift6758.data import async_get_data, get_data
+from ift6758.data.raw_store import JsonDirectoryStore
+from ift6758.data.nhl_api_stub import NHLApiStub
+from ift6758.data.async_get_data import AsyncNHLApiClient
+
+GAME_ID = 2016020001
+
+
+@pytest.fixture
+def stub(tmp_path):
+    store = JsonDirectoryStore(tmp_path)
+    store.save(GAME_ID, {"id": GAME_ID, "gameState": "OFF", "plays": []})
+    server = NHLApiStub(store).start()
+    yield server
+    server.stop()
+
+
+def test_session_is_closed_with_its_event_loop(stub):
+    client = AsyncNHLApiClient(stub.base_url)
+
+    async def fetch():
+        response = await client.get(f"/v1/gamecenter/{GAME_ID}/play-by-play")
+        return response.status_code, client.session
+
+    sessions = []
+    for _ in range(2):  # each asyncio.run has its own loop
+        status, session = asyncio.run(fetch())
+        assert status == 200
+        sessions.append(session)
+    assert sessions[0] is not sessions[1]
+    assert all(session.closed for session in sessions)
+
+
+def test_replaced_shared_client_is_closed(stub, monkeypatch):
+    monkeypatch.setattr(get_data, "api_client", get_data.NHLApiClient(stub.base_url))
+    monkeypatch.setattr(async_get_data, "async_api_client", None)
+    client = async_get_data.get_async_api_client()
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(client.get(f"/v1/gamecenter/{GAME_ID}/play-by-play"))
+        session = client.session
+        assert not session.closed  # the loop is still open: its async generators were not shut down
+
+        monkeypatch.setattr(get_data, "api_client", get_data.NHLApiClient(stub.base_url + "/other"))
+        assert async_get_data.get_async_api_client() is not client
+        assert session.closed
+    finally:
+        loop.close()
+
+
+def test_replaced_shared_client_is_closed_from_its_loop(stub, monkeypatch):
+    monkeypatch.setattr(get_data, "api_client", get_data.NHLApiClient(stub.base_url))
+    monkeypatch.setattr(async_get_data, "async_api_client", None)
+
+    async def replace():
+        client = async_get_data.get_async_api_client()
+        await client.get(f"/v1/gamecenter/{GAME_ID}/play-by-play")
+        session = client.session
+        get_data.api_client = get_data.NHLApiClient(stub.base_url + "/other")
+        async_get_data.get_async_api_client()
+        for _ in range(10):
+            await asyncio.sleep(0)
+        return session.closed
+
+    assert asyncio.run(replace())
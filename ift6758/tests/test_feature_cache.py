@@ -0,0 +1,19 @@
+from ift6758.features.context import ProcessingContext
+from ift6758.features.feature_cache import FeatureCache
+from ift6758.features.preprocess_II import PreprocessII
+
+
+def test_a_downloaded_game_is_served_from_the_cache(raw_store, api_stub, tmp_path):
+    cache = FeatureCache(tmp_path / "features")
+    builds = []
+
+    def build(game_id):
+        builds.append(game_id)
+        return PreprocessII(game_id, context=ProcessingContext(release_after_emit=True)).game_frame()
+
+    assert 2017020001 not in raw_store.stored_ids()
+    first = cache.get_or_build(2017020001, build)
+    second = cache.get_or_build(2017020001, build)
+    assert builds == [2017020001]  # the second call is a cache hit
+    assert second.equals(first)
+    assert FeatureCache.raw_checksum(2017020001) is not None
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+from legacy_feature_engineering import STEPS, LegacyFeatureEngineeringII
+from ift6758.features.feature_engineering_II import FeatureEngineeringII
+
+NAN = np.nan
+
+
+@pytest.fixture
+def shots() -> pd.DataFrame:
+    """shots of home team 1 against away team 31, with the missing values of real games"""
+    return pd.DataFrame({
+        "game_id": [2016020001] * 10,
+        "event_id": list(range(1, 11)),
+        "event_type": ["goal", "shot-on-goal", "goal", "goal", "shot-on-goal", "goal", "goal", "shot-on-goal", "goal", "shot-on-goal"],
+        "owner_team_id": [1, 31, 1, 31, 1, 31, NAN, 1, 7, 31],  # a missing owner and an owner of neither team
+        "home_team_id": [1] * 10,
+        "away_team_id": [31] * 10,
+        "home_team_side": ["left", "left", "right", "right", None, "left", "right", None, "left", "right"],  # sides not determined
+        "x_coord": [70.0, -60.0, NAN, 80.0, 55.0, NAN, -30.0, 10.0, 40.0, -88.0],
+        "y_coord": [10.0, -5.0, NAN, 3.0, -20.0, NAN, 12.0, 0.0, -1.0, 2.0],
+        "last_event_xCoord": [0.0, NAN, 20.0, -45.0, NAN, 60.0, 5.0, -70.0, NAN, 33.0],
+        "last_event_yCoord": [0.0, NAN, -8.0, 15.0, NAN, 7.0, -3.0, 22.0, NAN, -40.0],
+        # away goalie, away skaters, home skaters, home goalie: empty nets on both sides, both pulled, none
+        "situation_code": ["0651", "1560", "1551", "1551", "0650", "1541", "0651", "1560", "0651", "0660"],
+        "zone_code": ["O", "D", "N", None, "O", "X", "O", "N", "D", "O"],
+        "shot_type": ["wrist", "slap", None, "bat", "snap", "tip-in", "backhand", "deflected", "wrap-around", "wrist"],
+    })
+
+
+@pytest.mark.parametrize("step", list(STEPS))
+def test_vectorized_steps_match_the_row_by_row_steps(shots, step):
+    shots["last_event_type"] = ["faceoff", "hit", None, "penalty", "blocked-shot", "missed-shot", "stoppage", "takeaway", "giveaway", "period-start"]
+    frames = []
+    for klass in (LegacyFeatureEngineeringII, FeatureEngineeringII):
+        fe = klass(shots, compact=False)
+        STEPS[step](fe)
+        frames.append(fe.df)
+    pd.testing.assert_frame_equal(frames[1], frames[0])
+
+
+def test_align_coord_keeps_the_missing_coordinates(shots):
+    fe = FeatureEngineeringII(shots, compact=False)
+    fe.align_coord()
+    # the home team shoots right when it defends the left side, the others (even without a side) are mirrored
+    assert fe.df["current_x"].tolist()[:2] == [70.0, 60.0]
+    assert fe.df["current_x"].isna().tolist() == shots["x_coord"].isna().tolist()
+    assert fe.df["prev_x"].isna().tolist() == shots["last_event_xCoord"].isna().tolist()
+    assert fe.df["current_x"][4] == -55.0 and fe.df["current_x"][7] == -10.0
+
+
+def test_empty_net(shots):
+    fe = FeatureEngineeringII(shots, compact=False)
+    fe.extract_empty_net_feature(fe.df)
+    # scored by the home team without away goalie, by the away team without home goalie, by nobody of the game
+    assert fe.df["empty_net"].tolist() == [1, 1, 0, 0, 1, 0, 0, 0, 0, 1]
+    assert fe.df["empty_net"].dtype == np.int64
+
+
+def clean_features(frame, compact):
+    fe = FeatureEngineeringII(frame, compact=compact)
+    fe.clean_df()
+    return fe.df
+
+
+def test_compact_types_give_the_same_features(shots):
+    features = clean_features(shots, compact=True)
+    assert features["x_coord"].dtype == "float64"  # the nullable integers of the schema are filled with their mean
+    pd.testing.assert_frame_equal(features, clean_features(shots, compact=False), check_dtype=False, check_categorical=False)
+
+
+def test_compact_types_give_the_same_features_on_preprocessed_games(synthetic_games):
+    from ift6758.features.preprocess_II import PreprocessII
+
+    frame = pd.concat([PreprocessII.get_game_frame(game_id) for game_id in synthetic_games], ignore_index=True)
+    features = clean_features(frame, compact=True)
+    # the float32 of the schema only round the features
+    pd.testing.assert_frame_equal(features, clean_features(frame, compact=False), check_dtype=False, check_categorical=False, rtol=1e-5)
+
+
+def test_compact_frame_is_not_shared(shots):
+    fe = FeatureEngineeringII(shots, copy=False)
+    fe.clean_df()
+    assert "labels" not in shots and shots["x_coord"].isna().any()
@@ -0,0 +1,27 @@
+import time
+from ift6758.data import get_data
+
+MISSING_GAME = 2017020099  # not served by the stub
+
+
+def test_a_read_only_lookup_does_not_write_a_tombstone(raw_store, api_stub):
+    assert get_data.retrieve_game_data(MISSING_GAME) is None
+    assert not raw_store.manifest.is_tombstoned(MISSING_GAME, get_data.TOMBSTONE_TTL)
+    assert get_data.retrieve_game_data(MISSING_GAME, save=True) is None
+    assert raw_store.manifest.is_tombstoned(MISSING_GAME, get_data.TOMBSTONE_TTL)
+
+
+def test_closing_the_generator_early_cancels_the_queued_calls():
+    calls = []
+
+    def slow(game_id):
+        calls.append(game_id)
+        time.sleep(0.05)
+        return game_id
+
+    results = get_data.map_games_concurrently(slow, range(100), workers=2)
+    assert next(results)[1] is not None
+    results.close()
+    started = len(calls)
+    time.sleep(0.2)
+    assert started <= 4 and len(calls) == started
@@ -0,0 +1,10 @@
+import pandas as pd
+from ift6758.features.context import ProcessingContext
+from ift6758.features.preprocess import games_to_table_chunks
+
+
+def test_table_chunks_use_the_context_they_are_given(synthetic_games):
+    context = ProcessingContext()  # empty, and keeping its games
+    chunks = list(games_to_table_chunks(synthetic_games[:4], games_per_chunk=2, context=context))
+    assert len(chunks) == 2 and all(isinstance(chunk, pd.DataFrame) for chunk in chunks)
+    assert sorted(context.games) == synthetic_games[:4]
@@ -0,0 +1,156 @@
+import pickle
+import pandas as pd
+import pytest
+from ift6758.data import get_data
+from ift6758.features.context import ProcessingContext
+from ift6758.features.preprocess_II import PreprocessII
+from conftest import game_payload, play
+
+
+def build_serial(game_ids):
+    return {game_id: PreprocessII.get_game_frame(game_id, ProcessingContext(release_after_emit=True)) for game_id in game_ids}
+
+
+def test_raw_store_pickles_as_its_configuration(raw_store):
+    copy = pickle.loads(pickle.dumps(raw_store))
+    assert type(copy) is type(raw_store)
+    assert copy.data_dir == raw_store.data_dir
+
+
+@pytest.mark.parametrize("mp_context", ["spawn", "fork"])
+def test_parallel_build_uses_the_raw_store_of_the_parent(synthetic_games, mp_context):
+    # the store of the fixture is only known to the parent: spawned workers must receive it
+    frames, failures = PreprocessII.build_games_parallel(synthetic_games, workers=2, mp_context=mp_context)
+    assert failures == {}
+    expected = build_serial(synthetic_games)
+    assert sorted(frames) == sorted(expected)
+    for game_id, frame in expected.items():
+        pd.testing.assert_frame_equal(frames[game_id], frame)
+
+
+def test_interrupted_parallel_build_resumes_from_its_checkpoint(synthetic_games, tmp_path, monkeypatch):
+    from ift6758.features import preprocess_II
+
+    monkeypatch.setattr(preprocess_II, "regular_season_game_id_generator", lambda season: synthetic_games)
+    expected = PreprocessII.get_games_df([2016]).copy()
+
+    as_completed = preprocess_II.as_completed
+
+    def interrupted_after_one_game(futures):
+        for count, future in enumerate(as_completed(futures)):
+            if count == 1:
+                raise KeyboardInterrupt  # Ctrl-C while waiting for the second game
+            yield future
+
+    monkeypatch.setattr(preprocess_II, "as_completed", interrupted_after_one_game)
+    with pytest.raises(KeyboardInterrupt):
+        PreprocessII.get_games_df([2016], workers=2, checkpoint_dir=str(tmp_path / "checkpoint"), checkpoint_every=100)
+    checkpointed = set(preprocess_II.BuildCheckpoint(str(tmp_path / "checkpoint")).frames)
+    assert 1 <= len(checkpointed) < len(synthetic_games)
+
+    monkeypatch.setattr(preprocess_II, "as_completed", as_completed)
+    built = []
+    build_games_parallel = PreprocessII.build_games_parallel
+
+    def recording_build(game_ids, *args, **kwargs):
+        built.extend(game_ids)
+        return build_games_parallel(game_ids, *args, **kwargs)
+
+    monkeypatch.setattr(PreprocessII, "build_games_parallel", staticmethod(recording_build))
+    resumed = PreprocessII.get_games_df([2016], workers=2, checkpoint_dir=str(tmp_path / "checkpoint"))
+    assert sorted(built) == sorted(set(synthetic_games) - checkpointed)
+    pd.testing.assert_frame_equal(resumed, expected)
+
+
+def shot(event_id, period, time, owner, x=None, y=None, zone=None, type_desc_key="shot-on-goal"):
+    details = {"eventOwnerTeamId": owner, "shotType": "wrist", "goalieInNetId": 8000000}
+    details["scoringPlayerId" if type_desc_key == "goal" else "shootingPlayerId"] = 8400001
+    if x is not None:
+        details.update(xCoord=x, yCoord=y, zoneCode=zone)
+    return play(event_id, period, time, type_desc_key, **details)
+
+
+def handcrafted_game(game_id):
+    # home team 1 attacks the right net in the first period and the left one in the second
+    return game_payload(game_id, [
+        play(1, 1, "00:00", "period-start"),
+        play(2, 1, "00:05", "faceoff", eventOwnerTeamId=1, xCoord=0, yCoord=0, zoneCode="N"),
+        shot(3, 1, "00:20", 1, 70, 10, "O"),
+        play(4, 1, "00:21", "missed-shot", eventOwnerTeamId=1, xCoord=60, yCoord=-20, zoneCode="O"),
+        shot(5, 1, "00:22", 1, 80, -5, "O"),  # rebound
+        play(6, 1, "00:40", "hit", eventOwnerTeamId=31),  # no coordinates
+        shot(7, 1, "00:40", 31, -60, 20, "O"),  # no time since the last event
+        play(8, 1, "01:00", "blocked-shot", eventOwnerTeamId=31, xCoord=-50, yCoord=0, zoneCode="O"),
+        shot(9, 1, "01:10", 31, -85, 3, "O", "goal"),  # rebound
+        shot(10, 1, "01:30", 1),  # rebound without coordinates
+        play(11, 2, "00:00", "period-start"),
+        shot(12, 2, "00:30", 31, 40, -30, "O"),  # central vote, resolved by the next shot
+        play(13, 2, "00:31", "missed-shot", eventOwnerTeamId=1, xCoord=-30, yCoord=30, zoneCode="O"),
+        shot(14, 2, "00:31", 1, -75, 8, "O"),  # rebound, no time since the last event
+        play(15, 2, "00:50", "blocked-shot", eventOwnerTeamId=31, xCoord=-20, yCoord=4, zoneCode="D"),
+        shot(16, 2, "00:52", 1, -86, 1, "O", "goal"),  # rebound
+    ], home=1, away=31)
+
+
+def geometry_frames(game_id):
+    return [PreprocessII(game_id, context=ProcessingContext(release_after_emit=True), bulk=bulk).game_frame() for bulk in (False, True)]
+
+
+def test_bulk_geometry_matches_the_rows_on_a_handcrafted_game(raw_store):
+    raw_store.save(2016020100, handcrafted_game(2016020100))
+    rows, bulk = geometry_frames(2016020100)
+    assert rows["rebound"].sum() == 5 and rows["x_coord"].isna().sum() == 1
+    assert set(rows["home_team_side"]) == {"left", "right"}
+    pd.testing.assert_frame_equal(bulk, rows)
+
+
+def test_bulk_geometry_matches_the_rows_on_synthetic_games(synthetic_games):
+    for game_id in synthetic_games:
+        rows, bulk = geometry_frames(game_id)
+        pd.testing.assert_frame_equal(bulk, rows)
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_rebound_without_previous_coordinates_is_a_value_error(raw_store, bulk):
+    raw_store.save(2016020101, game_payload(2016020101, [
+        play(1, 1, "00:00", "period-start"),
+        shot(2, 1, "00:10", 1, 70, 10, "O"),
+        play(3, 1, "00:12", "blocked-shot", eventOwnerTeamId=31),  # no coordinates
+        shot(4, 1, "00:14", 1, 75, 2, "O"),  # rebound
+    ]))
+    with pytest.raises(ValueError, match="rebound 4 of game 2016020101"):
+        PreprocessII(2016020101, context=ProcessingContext(release_after_emit=True), bulk=bulk)
+
+
+def test_get_games_df_fills_the_context_it_is_given(synthetic_games, monkeypatch):
+    from ift6758.features import preprocess_II
+
+    monkeypatch.setattr(preprocess_II, "regular_season_game_id_generator", lambda season: synthetic_games)
+    context = ProcessingContext()  # empty, and keeping its games
+    PreprocessII.get_games_df([2016], context=context)
+    assert sorted(context.games) == sorted(synthetic_games)
+
+
+def test_games_df_keeps_the_default_types_unless_compact(synthetic_games, monkeypatch):
+    from ift6758.features import preprocess_II
+
+    monkeypatch.setattr(preprocess_II, "regular_season_game_id_generator", lambda season: synthetic_games)
+    games_df = PreprocessII.get_games_df([2016]).copy()
+    assert games_df["game_id"].dtype == "int64" and pd.api.types.is_string_dtype(games_df["shot_type"].dtype)
+    assert games_df["distance_from_net"].dtype == "float64"
+    compact_df = PreprocessII.get_games_df([2016], compact=True)
+    assert compact_df["game_id"].dtype == "int32" and compact_df["shot_type"].dtype == "category"
+    pd.testing.assert_frame_equal(preprocess_II.apply_schema(games_df), compact_df)
+
+
+def test_parallel_build_returns_its_failures(synthetic_games, raw_store):
+    raw_store.save(2016020100, game_payload(2016020100, [
+        play(1, 1, "00:00", "period-start"),
+        play(2, 1, "00:12", "blocked-shot", eventOwnerTeamId=31),  # no coordinates
+        shot(3, 1, "00:14", 1, 75, 2, "O"),  # rebound
+    ]))
+    result = PreprocessII.build_games_parallel(synthetic_games[:2] + [2016020100], workers=2)
+    assert sorted(result.frames) == synthetic_games[:2]
+    assert list(result.failures) == [2016020100] and "ValueError" in result.failures[2016020100]
+    assert sorted(PreprocessII.build_games_parallel(synthetic_games[:2], workers=2).frames) == synthetic_games[:2]
+    assert list(result.failures) == [2016020100]  # a later build does not touch the failures of this one
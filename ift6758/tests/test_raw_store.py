@@ -0,0 +1,27 @@
+from typing import List, Optional
+import pytest
+from ift6758.data.raw_store import RawStore, JsonDirectoryStore, SeasonShardStore
+
+
+class PartialStore(RawStore):
+    name = "partial"
+
+    def read(self, game_id) -> Optional[bytes]:
+        return None
+
+
+def test_store_missing_a_method_can_not_be_created(tmp_path):
+    with pytest.raises(TypeError, match="abstract"):
+        PartialStore(tmp_path)
+
+
+@pytest.mark.parametrize("store_class", [JsonDirectoryStore, SeasonShardStore])
+def test_store_round_trip(tmp_path, store_class):
+    store = store_class(tmp_path)
+    data = {"id": 2016020001, "gameState": "OFF", "plays": [{"eventId": 1}]}
+    store.save(2016020001, data)
+    assert store.stored_ids() == [2016020001]
+    assert store.load(2016020001) == data
+    assert store.load(2016020001, fields=["plays"]) == {"plays": data["plays"]}
+    store.remove(2016020001)
+    assert store.load(2016020001) is None
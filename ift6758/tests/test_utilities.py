@@ -0,0 +1,23 @@
+from conftest import game_payload, play
+from ift6758.features.context import ProcessingContext
+from ift6758.features.event_types import Event
+from ift6758.features.game import Game
+
+
+def test_renaming_helpers_work_on_slotted_events():
+    faceoff = play(1, 1, "00:05", "faceoff", xCoord=0, yCoord=0, reason=None)
+    context = ProcessingContext()
+    game = Game(game_payload(2016020001, [faceoff]), context=context)
+    event = Event(game, faceoff, prev_event=True, context=context)
+    assert not hasattr(event, "__dict__")
+    prev = event.to_dict()
+    assert prev["prev_eventId"] == 1 and "eventId" not in prev
+
+    event.stripAttribute("prev_")
+    assert event.to_dict() == {key[len("prev_"):]: value for key, value in prev.items()}
+
+    event.addPrefix("prev_")
+    assert event.to_dict() == prev
+
+    event.renameAttribute("prev_xCoord", "xCoord")
+    assert event.xCoord == 0 and not hasattr(event, "prev_xCoord")